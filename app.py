@@ -1,122 +1,30 @@
 import streamlit as st
-import pandas as pd
-from db import init_db, get_session, User, Availability, Potluck, Wish, Vote
-import hashlib
-import json
+from streamlit.errors import StreamlitAPIException
+from db import init_db, get_session, User
+from queries import (
+    event_by_slug, default_event, user_events, join_event, event_members,
+    user_dates, add_date, remove_date, cached_group_date_counts, availability_matrix,
+    own_potluck, save_potluck, potluck_table, cached_potluck_table, save_assignments,
+    my_votes, cached_vote_counts, cast_vote,
+    my_wishes, my_claims, add_wish, cached_open_wishes, claim_wish, release_wish,
+    add_exclusion, santa_exclusions, santa_draw_events, draw_santa, my_santa_receiver,
+)
+from cache import aggregates, AVAILABILITY, POTLUCKS, VOTES, WISHES
+from snapshot import snapshots
+from assignment import assign_dishes
+from paging import matches, seeded_order, paginate, MARKET_PAGE_SIZE, VOTE_PAGE_SIZE
+from auth import hash_password, verify_password
+import sessions
+import versions
+from images import carousel_css
+from styles import load_styles, stylesheet_url
+import instrumentation
+from instrumentation import traced
 import datetime
-import random
 
 # Page Config
 st.set_page_config(page_title="Reunión Anual", page_icon="🎉", layout="wide")
 
-def load_styles():
-    st.markdown("""
-    <style>
-
-    /* --- Shared Background & Carousel --- */
-    .landing-bg {
-        position: fixed;
-        top: 0;
-        left: 0;
-        width: 100vw;
-        height: 100vh;
-        z-index: -2;
-        background-size: cover;
-        background-position: center;
-        background-color: #2d2a4a; /* Fallback */
-        animation: bgCarousel 20s infinite ease-in-out;
-    }
-    
-    @keyframes bgCarousel {
-        0% { background-image: url('assets/IMG-20191220-WA0023.jpg'); }
-        25% { background-image: url('assets/IMG-20220121-WA0006.jpg'); }
-        50% { background-image: url('assets/IMG-20220306-WA0039.jpg'); }
-        75% { background-image: url('assets/IMG-20220710-WA0020.jpg'); }
-        100% { background-image: url('assets/IMG-20191220-WA0023.jpg'); }
-    }
-
-    .landing-overlay {
-        position: fixed;
-        top: 0;
-        left: 0;
-        width: 100vw;
-        height: 100vh;
-        background: rgba(45, 42, 74, 0.6); /* Slightly darker for text readability */
-        z-index: -1;
-        backdrop-filter: blur(4px);
-    }
-    
-    /* --- Snow Effect --- */
-    .snow {
-        position: fixed;
-        top: 0;
-        left: 0;
-        width: 100%;
-        height: 100%;
-        pointer-events: none;
-        z-index: 100;
-        background-image: 
-            radial-gradient(4px 4px at 10% 10%, rgba(255,255,255,0.8), transparent),
-            radial-gradient(6px 6px at 20% 30%, rgba(255,255,255,0.6), transparent),
-            radial-gradient(3px 3px at 40% 70%, rgba(255,255,255,0.9), transparent),
-            radial-gradient(4px 4px at 60% 20%, rgba(255,255,255,0.7), transparent),
-            radial-gradient(5px 5px at 90% 80%, rgba(255,255,255,0.8), transparent);
-        background-size: 200px 200px;
-        animation: snowAnim 10s linear infinite;
-    }
-    
-    @keyframes snowAnim {
-        from { transform: translateY(0); }
-        to { transform: translateY(200px); }
-    }
-    
-    /* --- Card & Mobile First Layout --- */
-    div[data-testid="stVerticalBlockBorderWrapper"] {
-        background-color: rgba(25, 25, 35, 0.85);
-        border-radius: 20px;
-        padding: 1.5rem;
-        border: 1px solid rgba(255, 255, 255, 0.1);
-        backdrop-filter: blur(10px);
-        margin: 0 auto;
-        max-width: 95vw; /* Mobile friendly max width */
-    }
-    
-    @media (min-width: 768px) {
-        div[data-testid="stVerticalBlockBorderWrapper"] {
-            padding: 2.5rem;
-            max-width: 500px; /* Limit width on desktop */
-        }
-    }
-
-    /* Style inputs inside the dark card */
-    .stTextInput label {
-        color: #eee !important;
-    }
-    
-    /* Make buttons pop */
-    button[kind="primary"] {
-        background-color: #c0392b !important; /* Christmas Red style optionally, or stick to purple */
-        /* Let's keep purple but maybe a bit more festive? Or Red for Xmas? User said "Navidad" style. */
-        /* Let's go with a nice warm red/gold accent or stick to the purple if user prefers. 
-           User said "Temática navideña", let's try a festive red. */
-        background-color: #D42426 !important;
-        border: none;
-        font-weight: bold;
-        transition: transform 0.1s;
-    }
-    button[kind="primary"]:hover {
-        transform: scale(1.02);
-        background-color: #E74C3C !important;
-    }
-    
-    h1, h2, h3 {
-        font-family: 'Helvetica Neue', sans-serif;
-    }
-
-    </style>
-    """, unsafe_allow_html=True)
-
-
 load_styles()
 
 # Session State Initialization
@@ -126,19 +34,99 @@ if 'user_id' not in st.session_state:
     st.session_state.user_id = None
 if 'username' not in st.session_state:
     st.session_state.username = None
-
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+if 'event_id' not in st.session_state:
+    st.session_state.event_id = None
+if 'session_token' not in st.session_state:
+    st.session_state.session_token = None
+if 'pending_cookie' not in st.session_state:
+    st.session_state.pending_cookie = None  # token to store, "" to clear, None for nothing
 
 def logout():
     st.header("Cerrar Sesión")
     st.write("¿Estás seguro que quieres salir?")
     if st.button("Sí, cerrar sesión", type="primary"):
+        if st.session_state.session_token:
+            sessions.revoke(st.session_state.session_token)
+        st.session_state.pending_cookie = ""
         st.session_state.logged_in = False
         st.session_state.user_id = None
         st.session_state.username = None
+        st.session_state.event_id = None
+        st.session_state.session_token = None
+        st.rerun()
+
+# ----------------------------------------
+# Fragments
+# ----------------------------------------
+
+def rerun_fragment(area):
+    # Reruns just the fragment after one of its writes to area. A click that
+    # arrives with a full rerun (Streamlit merges queued reruns) reruns the page.
+    mark_seen(area)
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+def mark_seen(area):
+    # The fragment is about to show this session's own change: the poller
+    # must not rerun the whole page for it. Not in snapshot mode, where the
+    # fragment still reads the old snapshot and only the poller's rerun
+    # after the rebuild shows the change.
+    seen = st.session_state.get("seen_versions")
+    if seen is None or area not in seen or snapshots.enabled:
+        return
+    session = get_session()
+    seen[area] = versions.current(session, st.session_state.event_id)[area]
+    session.close()
+
+def live_refresh(event_id, *areas):
+    # Whatever this full run draws is current: start watching from here
+    st.session_state.pop("seen_versions", None)
+    poll_versions(event_id, areas)
+
+@st.fragment(run_every=versions.LIVE_REFRESH_SECONDS or None)
+def poll_versions(event_id, areas):
+    # Draws nothing; an idle tick is one primary-key read. Not traced: a
+    # span per tick per open page would push the real reruns out of the
+    # instrumentation buffer
+    session = get_session()
+    now = versions.current(session, event_id)
+    session.close()
+    # Another worker may have made the change; the first session of this
+    # process to notice drops the process's cached copy
+    versions.catch_up(event_id, now)
+    now = {area: now[area] for area in areas}
+    seen = st.session_state.get("seen_versions")
+    st.session_state.seen_versions = now
+    if seen is not None and seen != now:
         st.rerun()
 
+# ----------------------------------------
+# Long lists: search box and pager
+# ----------------------------------------
+
+def _set_page(key, page):
+    st.session_state[f"{key}_page"] = page
+
+def search_box(key, label):
+    # A new search starts again from the first page
+    return st.text_input(label, key=f"{key}_search", on_change=_set_page, args=(key, 0))
+
+def current_page(key, items, size):
+    """The items on the session's current page of this list, plus (page, pages)."""
+    page_items, page, pages = paginate(items, st.session_state.get(f"{key}_page", 0), size)
+    _set_page(key, page)
+    return page_items, page, pages
+
+def pager(key, page, pages):
+    if pages <= 1:
+        return
+    c1, c2, c3 = st.columns([1, 2, 1])
+    c1.button("◀ Anterior", key=f"{key}_prev", disabled=page == 0, on_click=_set_page, args=(key, page - 1))
+    c2.caption(f"Página {page + 1} de {pages}")
+    c3.button("Siguiente ▶", key=f"{key}_next", disabled=page == pages - 1, on_click=_set_page, args=(key, page + 1))
+
 # ----------------------------------------
 # Page Functions
 # ----------------------------------------
@@ -146,37 +134,25 @@ def logout():
 def show_profile():
     st.header("📅 Mi Disponibilidad")
     st.write("Indica las fechas en las que puedes asistir a la reunión.")
-    
+    live_refresh(st.session_state.event_id, AVAILABILITY)
+    availability(st.session_state.event_id, st.session_state.user_id)
+
+@st.fragment
+@traced
+def availability(event_id, user_id):
+    # A fragment: adding or removing a date reruns only this section, which
+    # includes the group summary the change affects
     session = get_session()
-    user_id = st.session_state.user_id
     
     # Get existing availability
-    avail = session.query(Availability).filter(Availability.user_id == user_id).first()
-    
-    current_dates = []
-    if avail and avail.dates_json:
-        try:
-            current_dates_str = json.loads(avail.dates_json)
-            current_dates = current_dates_str
-        except:
-            pass
+    current_dates = user_dates(session, event_id, user_id)
 
     with st.expander("Géstionar mis fechas", expanded=True):
         new_date = st.date_input("Agregar fecha disponible", min_value=datetime.date.today())
         if st.button("Agregar Fecha", key="add_date"):
-            date_str = new_date.strftime("%Y-%m-%d")
-            if date_str not in current_dates:
-                current_dates.append(date_str)
-                current_dates.sort()
-                
-                if not avail:
-                    avail = Availability(user_id=user_id, dates_json=json.dumps(current_dates))
-                    session.add(avail)
-                else:
-                    avail.dates_json = json.dumps(current_dates)
-                session.commit()
-                st.success(f"Fecha {date_str} agregada.")
-                st.rerun()
+            if add_date(session, event_id, user_id, new_date):
+                st.success(f"Fecha {new_date:%Y-%m-%d} agregada.")
+                rerun_fragment(AVAILABILITY)
             else:
                 st.warning("Esa fecha ya está en tu lista.")
 
@@ -186,171 +162,169 @@ def show_profile():
                 col1, col2 = st.columns([4, 1])
                 col1.write(f"🗓️ {d}")
                 if col2.button("🗑️", key=f"del_{d}"):
-                    current_dates.remove(d)
-                    avail.dates_json = json.dumps(current_dates)
-                    session.commit()
-                    st.rerun()
+                    remove_date(session, event_id, user_id, d)
+                    rerun_fragment(AVAILABILITY)
         else:
             st.info("No has seleccionado fechas aún.")
     
     # Summary of everyone's availability
     st.divider()
     st.subheader("📊 Disponibilidad del Grupo")
-    all_avails = session.query(Availability).all()
-    date_counts = {}
-    for a in all_avails:
-        if a.dates_json:
-            try:
-                dates = json.loads(a.dates_json)
-                for d in dates:
-                    date_counts[d] = date_counts.get(d, 0) + 1
-            except:
-                pass
+    snapshot_note()
+    date_counts = cached_group_date_counts(session, event_id)
     
     if date_counts:
-        df = pd.DataFrame(list(date_counts.items()), columns=["Fecha", "Coincidencias"])
-        df = df.sort_values(by="Coincidencias", ascending=False)
-        st.dataframe(df, hide_index=True)
+        # Column-oriented plain lists; st.dataframe takes them as they are
+        dates, counts = zip(*date_counts)
+        st.dataframe({"Fecha": dates, "Coincidencias": counts}, hide_index=True)
+        recommendations(session, event_id)
     
     session.close()
 
+def recommendations(session, event_id):
+    st.subheader("🏆 Fechas recomendadas")
+    matrix = availability_matrix(session, event_id)
+    c1, c2, c3 = st.columns(3)
+
+    best = matrix.best_dates(1)
+    if best:
+        c1.metric("Mejor fecha", f"{best[0][0]:%Y-%m-%d}", f"{best[0][1]} pueden", delta_color="off")
+
+    length = c2.number_input("Días seguidos", min_value=2, max_value=14, value=2, key="window_days")
+    windows = matrix.best_windows(length, 1)
+    if windows:
+        first, full, _ = windows[0]
+        last = first + datetime.timedelta(days=length - 1)
+        c2.caption(f"Del {first:%Y-%m-%d} al {last:%Y-%m-%d}: {full} pueden todos los días")
+    else:
+        c2.caption("No hay tantos días propuestos.")
+
+    # Everyone who proposed a potluck dish has to be able to come
+    cooks = {p["user_id"] for p in cached_potluck_table(session, event_id) if p["dish_1"] or p["dish_2"] or p["dish_3"]}
+    covering = matrix.covering_dates(cooks, 1) if cooks else []
+    if covering:
+        date, covered, attendees = covering[0]
+        c3.metric("Con los del potluck", f"{date:%Y-%m-%d}", f"{covered} de {len(cooks)} · {attendees} en total",
+                  delta_color="off")
+    else:
+        c3.caption("Nadie del potluck ha marcado fechas.")
+
 def show_potluck():
     st.header("🍲 Potluck: ¿Qué llevamos?")
     st.write("Propón 3 opciones de platillos. El sistema o el admin ayudarán a asignar para no repetir.")
     
     session = get_session()
     user_id = st.session_state.user_id
+    event_id = st.session_state.event_id
+    live_refresh(event_id, POTLUCKS, VOTES)
     
-    potluck = session.query(Potluck).filter(Potluck.user_id == user_id).first()
+    potluck = own_potluck(session, event_id, user_id)
     
     with st.form("potluck_form"):
-        d1 = st.text_input("Opción 1 (Tu favorita)", value=potluck.dish_1 if potluck else "")
-        d2 = st.text_input("Opción 2", value=potluck.dish_2 if potluck else "")
-        d3 = st.text_input("Opción 3", value=potluck.dish_3 if potluck else "")
+        d1 = st.text_input("Opción 1 (Tu favorita)", value=potluck["dish_1"] if potluck else "")
+        d2 = st.text_input("Opción 2", value=potluck["dish_2"] if potluck else "")
+        d3 = st.text_input("Opción 3", value=potluck["dish_3"] if potluck else "")
         
         submitted = st.form_submit_button("Guardar Opciones")
         if submitted:
-            if not potluck:
-                potluck = Potluck(user_id=user_id)
-                session.add(potluck)
-            potluck.dish_1 = d1
-            potluck.dish_2 = d2
-            potluck.dish_3 = d3
-            session.commit()
+            save_potluck(session, event_id, user_id, d1, d2, d3)
             st.success("Opciones guardadas.")
             st.rerun()
     
-    if potluck and potluck.assigned_dish:
-        st.success(f"✅ ¡Se te ha asignado: **{potluck.assigned_dish}**!")
+    if potluck and potluck["assigned_dish"]:
+        st.success(f"✅ ¡Se te ha asignado: **{potluck['assigned_dish']}**!")
     else:
         st.info("Aún no se te asigna un platillo definitivo.")
 
     st.divider()
     st.subheader("👀 Qué propusieron los demás")
-    all_potlucks = session.query(Potluck).join(User).all()
+    snapshot_note()
+    all_potlucks = cached_potluck_table(session, event_id)
     
-    potluck_data = []
-    for p in all_potlucks:
-        potluck_data.append({
-            "Amigo": p.user.name or p.user.username,
-            "Opción 1": p.dish_1,
-            "Opción 2": p.dish_2,
-            "Opción 3": p.dish_3,
-            "Asignado": p.assigned_dish or "Pendiente"
+    if all_potlucks:
+        st.dataframe({
+            "Amigo": [p["name"] for p in all_potlucks],
+            "Opción 1": [p["dish_1"] for p in all_potlucks],
+            "Opción 2": [p["dish_2"] for p in all_potlucks],
+            "Opción 3": [p["dish_3"] for p in all_potlucks],
+            "Asignado": [p["assigned_dish"] or "Pendiente" for p in all_potlucks],
         })
-    
-    if potluck_data:
-        st.dataframe(pd.DataFrame(potluck_data))
         
         st.divider()
         st.subheader("🗳️ Vota por tu favorito")
         st.write("Ayuda a tus amigos a decidir qué traer. ¡Vota por la opción que más se te antoje! (Solo 1 voto por amigo)")
+        vote_cards(event_id, user_id)
 
-        # Fetch Votes
-        votes = session.query(Vote).filter(Vote.voter_id == user_id).all()
-        # Map: potluck_id -> dish_choice
-        my_votes = {v.potluck_id: v.dish_choice for v in votes}
-        
-        # Calculate vote counts
-        all_votes = session.query(Vote).all()
-        vote_counts = {} # (potluck_id, dish_num) -> count
-        for v in all_votes:
-            key = (v.potluck_id, v.dish_choice)
-            vote_counts[key] = vote_counts.get(key, 0) + 1
-
-        for p in all_potlucks:
-            # Don't vote for myself? Maybe allowed? Usually yes in these groups.
-            # But let's assume voting for others is the main goal.
-            # Showing user card
-            
-            with st.container(border=True):
-                st.markdown(f"#### 👤 {p.user.name or p.user.username}")
-                
-                # Option 1
-                c1, c2, c3 = st.columns(3)
-                
-                # Helper to render option
-                def render_option(col, dish_text, dish_num):
-                    if dish_text:
-                        count = vote_counts.get((p.id, dish_num), 0)
-                        is_selected = (my_votes.get(p.id) == dish_num)
-                        
-                        btn_label = f"👍 {count}" if not is_selected else f"✅ {count}"
-                        btn_type = "primary" if is_selected else "secondary"
-                        
-                        col.markdown(f"**Opción {dish_num}:** {dish_text}")
-                        if col.button(btn_label, key=f"v_{p.id}_{dish_num}", type=btn_type):
-                            # Handle Vote
-                            # Check if existing vote for this potluck
-                            existing_vote = session.query(Vote).filter(Vote.voter_id == user_id, Vote.potluck_id == p.id).first()
-                            if existing_vote:
-                                if existing_vote.dish_choice == dish_num:
-                                    # Toggle off? Or just keep? Let's allow toggle off if same clicked
-                                    # But for simplicity, just update choice. 
-                                    # If user clicked same, maybe unvote? 
-                                    # Let's say: Update to this choice.
-                                    existing_vote.dish_choice = dish_num 
-                                else:
-                                    existing_vote.dish_choice = dish_num
-                            else:
-                                new_vote = Vote(voter_id=user_id, potluck_id=p.id, dish_choice=dish_num)
-                                session.add(new_vote)
-                            
-                            session.commit()
-                            st.rerun()
-                    else:
-                        col.caption(f"Opción {dish_num} vacía")
-
-                render_option(c1, p.dish_1, 1)
-                render_option(c2, p.dish_2, 2)
-                render_option(c3, p.dish_3, 3)
-
-        
         # Admin assignment tool (Locked to tengorio)
         if st.session_state.username == 'tengorio':
             st.divider()
             st.markdown("### 🛠️ Admin Zone")
             if st.button("🧙 Auto-Asignar (Beta)"):
-                assigned_so_far = set()
-                all_ps = session.query(Potluck).all()
-                for p in all_ps:
-                    if p.dish_1 and p.dish_1 not in assigned_so_far:
-                        p.assigned_dish = p.dish_1
-                        assigned_so_far.add(p.dish_1)
-                    elif p.dish_2 and p.dish_2 not in assigned_so_far:
-                        p.assigned_dish = p.dish_2
-                        assigned_so_far.add(p.dish_2)
-                    elif p.dish_3 and p.dish_3 not in assigned_so_far:
-                        p.assigned_dish = p.dish_3
-                        assigned_so_far.add(p.dish_3)
-                    else:
-                        p.assigned_dish = "CONFLICTO: Hablar con Admin"
-                session.commit()
+                entries = [(p["id"], [p["dish_1"], p["dish_2"], p["dish_3"]]) for p in potluck_table(session, event_id)]
+                assignments = {
+                    potluck_id: dish or "CONFLICTO: Hablar con Admin"
+                    for potluck_id, dish in assign_dishes(entries, cached_vote_counts(session, event_id)).items()
+                }
+                save_assignments(session, event_id, assignments)
                 st.success("Asignación automática completada.")
                 st.rerun()
 
     session.close()
 
+@st.fragment
+@traced
+def vote_cards(event_id, user_id):
+    # A fragment: a vote, search or page change reruns only the cards
+    session = get_session()
+    all_potlucks = cached_potluck_table(session, event_id)
+
+    # Map: potluck_id -> dish_choice
+    voted = my_votes(session, event_id, user_id)
+
+    # (potluck_id, dish_num) -> count, shared by every session
+    vote_counts = cached_vote_counts(session, event_id)
+
+    query = search_box("votes", "🔎 Buscar amigo o platillo")
+    found = [p for p in all_potlucks if matches(query, p["name"], p["dish_1"], p["dish_2"], p["dish_3"])]
+    if not found:
+        st.info("Nadie coincide con tu búsqueda.")
+    page_potlucks, page, pages = current_page("votes", found, VOTE_PAGE_SIZE)
+
+    for p in page_potlucks:
+        # Don't vote for myself? Maybe allowed? Usually yes in these groups.
+        # But let's assume voting for others is the main goal.
+        # Showing user card
+
+        with st.container(border=True):
+            st.markdown(f"#### 👤 {p['name']}")
+
+            # Option 1
+            c1, c2, c3 = st.columns(3)
+
+            # Helper to render option
+            def render_option(col, dish_text, dish_num):
+                if dish_text:
+                    count = vote_counts.get((p["id"], dish_num), 0)
+                    is_selected = (voted.get(p["id"]) == dish_num)
+
+                    btn_label = f"👍 {count}" if not is_selected else f"✅ {count}"
+                    btn_type = "primary" if is_selected else "secondary"
+
+                    col.markdown(f"**Opción {dish_num}:** {dish_text}")
+                    if col.button(btn_label, key=f"v_{p['id']}_{dish_num}", type=btn_type):
+                        # Handle Vote (clicking again keeps the same choice)
+                        cast_vote(session, event_id, user_id, p["id"], dish_num)
+                        rerun_fragment(VOTES)
+                else:
+                    col.caption(f"Opción {dish_num} vacía")
+
+            render_option(c1, p["dish_1"], 1)
+            render_option(c2, p["dish_2"], 2)
+            render_option(c3, p["dish_3"], 3)
+
+    pager("votes", page, pages)
+    session.close()
+
 def show_secretsanta():
     st.header("🎁 Mercado de Regalos (Secret Santa)")
     st.markdown("""
@@ -362,66 +336,142 @@ def show_secretsanta():
     
     session = get_session()
     user_id = st.session_state.user_id
+    event_id = st.session_state.event_id
+    live_refresh(event_id, WISHES)
     
     # 1. My Wishes
     st.subheader("1. Mis Deseos")
-    my_wishes = session.query(Wish).filter(Wish.user_id == user_id).all()
+    wishes = my_wishes(session, event_id, user_id)
     
     c1, c2 = st.columns([3, 1])
     new_wish_desc = c1.text_input("Agregar un deseo/idea", key="new_wish")
     if c2.button("Agregar Deseo"):
-        if len(my_wishes) >= 5:
+        if len(wishes) >= 5:
             st.error("Máximo 5 deseos.")
         elif new_wish_desc:
-            w = Wish(user_id=user_id, description=new_wish_desc)
-            session.add(w)
-            session.commit()
+            add_wish(session, event_id, user_id, new_wish_desc)
             st.rerun()
     
-    if my_wishes:
-        for w in my_wishes:
-            st.text(f"- {w.description}")
+    if wishes:
+        for w in wishes:
+            st.text(f"- {w['description']}")
             
     st.divider()
     
     # 2. Market
     st.subheader("2. Mercado de Regalos (Claim)")
+    market(event_id, user_id)
+
+    st.divider()
+
+    # 3. Draw
+    st.subheader("3. Sorteo")
+    receiver = my_santa_receiver(session, event_id, user_id)
+    if receiver:
+        st.success(f"🎅 Te tocó regalarle a **{receiver[1]}**")
+        receiver_wishes = my_wishes(session, event_id, receiver[0])
+        if receiver_wishes:
+            st.write("Sus deseos:")
+            for w in receiver_wishes:
+                st.text(f"- {w['description']}")
+        else:
+            st.caption("Aún no ha escrito deseos.")
+    else:
+        st.info("El sorteo aún no se ha hecho.")
+
+    # Admin draw tool (Locked to tengorio)
+    if st.session_state.username == 'tengorio':
+        st.divider()
+        st.markdown("### 🛠️ Admin Zone")
+        members = event_members(session, event_id)
+        names = dict(members)
+        ids = list(names)
+
+        st.write("Exclusiones (parejas que no se pueden tocar entre sí):")
+        c1, c2, c3 = st.columns([2, 2, 1])
+        first = c1.selectbox("Persona", ids, format_func=names.get, key="exclude_a")
+        second = c2.selectbox("No le puede tocar", ids, format_func=names.get, key="exclude_b")
+        if c3.button("Agregar"):
+            if first == second:
+                st.error("Elige dos personas distintas.")
+            else:
+                add_exclusion(session, event_id, first, second)
+                st.rerun()
+        pairs = sorted({tuple(sorted(pair)) for pair in santa_exclusions(session, event_id)})
+        if pairs:
+            st.caption(" · ".join(f"{names.get(g, g)} ↔ {names.get(r, r)}" for g, r in pairs))
+
+        past = dict(santa_draw_events(session, event_id))
+        avoid_event_id = st.selectbox("No repetir las parejas del sorteo de", [None] + list(past),
+                                      format_func=lambda e: past.get(e, "Ningún evento"), key="santa_avoid_event")
+        keep_claims = st.checkbox("Conservar los regalos ya escogidos en el mercado", value=True)
+        if st.button("🎲 Sortear"):
+            try:
+                drawn, kept = draw_santa(session, event_id, avoid_event_id, keep_claims)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                if keep_claims and not kept:
+                    st.warning("Los regalos escogidos no cabían con las exclusiones; se sorteó sin ellos.")
+                st.success(f"Sorteo hecho: {len(drawn)} parejas.")
+
+    session.close()
+
+@st.fragment
+@traced
+def market(event_id, user_id):
+    # A fragment: claiming, releasing or paging reruns only the market
+    session = get_session()
+    snapshot_note()
     
-    available_wishes = session.query(Wish).filter(Wish.user_id != user_id, Wish.claimed_by_id == None).all()
-    my_claims = session.query(Wish).filter(Wish.claimed_by_id == user_id).all()
+    available_wishes = [w for w in cached_open_wishes(session, event_id) if w["user_id"] != user_id]
+    claims = my_claims(session, event_id, user_id)
     
-    if my_claims:
-        st.success(f"🎁 Ya has escogido {len(my_claims)} regalo(s) para comprar:")
-        for c in my_claims:
-            st.info(f"🎁 **{c.description}**\n\n🏷️ **Etiqueta el regalo con el ID: #{c.id}** (¡No pongas el nombre del destinatario, solo este número!)")
-            if st.button(f"Soltar #{c.id}", key=f"release_{c.id}"):
-                c.claimed_by_id = None
-                session.commit()
-                st.rerun()
+    if claims:
+        st.success(f"🎁 Ya has escogido {len(claims)} regalo(s) para comprar:")
+        for c in claims:
+            st.info(f"🎁 **{c['description']}**\n\n🏷️ **Etiqueta el regalo con el ID: #{c['id']}** (¡No pongas el nombre del destinatario, solo este número!)")
+            if st.button(f"Soltar #{c['id']}", key=f"release_{c['id']}"):
+                release_wish(session, event_id, c["id"], user_id)
+                rerun_fragment(WISHES)
     
     st.write("### Regalos disponibles para escoger:")
     if available_wishes:
-        display_wishes = list(available_wishes)
-        random.shuffle(display_wishes)
-        
+        # Shuffled per user (so nobody's wishes always come first), but the
+        # same order on every rerun so the pages hold still
+        query = search_box("market", "🔎 Buscar regalo")
+        found = seeded_order([w for w in available_wishes if matches(query, w["description"])], event_id, user_id)
+        st.caption(f"{len(found)} de {len(available_wishes)} regalos")
+        display_wishes, page, pages = current_page("market", found, MARKET_PAGE_SIZE)
+
         for w in display_wishes:
             col1, col2 = st.columns([4, 1])
-            col1.write(f"❓ {w.description}")
-            if col2.button("✋ Yo lo compro", key=f"claim_{w.id}"):
-                w.claimed_by_id = user_id
-                session.commit()
-                st.balloons()
-                st.rerun()
+            col1.write(f"❓ {w['description']}")
+            if col2.button("✋ Yo lo compro", key=f"claim_{w['id']}"):
+                if claim_wish(session, event_id, w["id"], user_id):
+                    st.balloons()
+                    rerun_fragment(WISHES)
+                else:
+                    st.warning("¡Alguien más lo escogió primero! Escoge otro regalo.")
+        pager("market", page, pages)
     else:
         st.warning("No hay más regalos disponibles para escoger (o son tuyos).")
     
     session.close()
 
+def resolve_event(session):
+    """(id, slug, name) of the event in the link (?evento=slug), else the default one."""
+    slug = st.query_params.get("evento")
+    event = event_by_slug(session, slug) if slug else None
+    return event or default_event(session)
+
 def login_page():
     if 'auth_mode' not in st.session_state:
         st.session_state.auth_mode = 'landing'
 
-    # Background and Snow
+    # Background and Snow (the carousel keyframes are in the stylesheet when it is served)
+    if stylesheet_url() is None:
+        st.markdown(f"<style>\n{carousel_css()}\n</style>", unsafe_allow_html=True)
     st.markdown("""
         <div class="landing-bg"></div>
         <div class="landing-overlay"></div>
@@ -432,14 +482,8 @@ def login_page():
     # LANDING VIEW
     # ------------------
     if st.session_state.auth_mode == 'landing':
-        st.markdown("""
-            <div class="landing-container">
-            </div>
-            <style>
-            [data-testid="stHeader"] {display: none;}
-            .block-container {padding-top: 0; padding-bottom: 0;}
-            </style>
-        """, unsafe_allow_html=True)
+        # Hides the header while present (see the :has() rules in assets/styles.css)
+        st.markdown('<div class="landing-container"></div>', unsafe_allow_html=True)
         
         # Center Content
         # Mobile-First: We use columns, but on mobile columns stack. 
@@ -456,7 +500,10 @@ def login_page():
             st.markdown("<div style='height: 25vh;'></div>", unsafe_allow_html=True)
             
             with st.container(border=True):
-                st.markdown("<h1 style='text-align: center; color: white;'>🎄 Reunión Anual 2025 🎅</h1>", unsafe_allow_html=True)
+                session = get_session()
+                event_name = resolve_event(session)[2]
+                session.close()
+                st.markdown(f"<h1 style='text-align: center; color: white;'>🎄 {event_name} 🎅</h1>", unsafe_allow_html=True)
                 st.markdown("<p style='text-align: center; color: #eee; margin-bottom: 25px; font-size: 1.1rem;'>🎁 Intercambio · 🍲 Cena · 🎉 Fiesta</p>", unsafe_allow_html=True)
                 
                 b1, b2 = st.columns(2)
@@ -482,10 +529,21 @@ def login_page():
                 if st.button("Entrar", type="primary", use_container_width=True):
                     session = get_session()
                     user = session.query(User).filter(User.username == username).first()
-                    if user and user.password_hash == hash_password(password):
+                    ok, needs_rehash = verify_password(password, user.password_hash) if user else (False, False)
+                    if ok:
+                        if needs_rehash:
+                            # Upgrade legacy/outdated hashes now that we know the password
+                            user.password_hash = hash_password(password)
+                            session.commit()
+                        event = resolve_event(session)
+                        join_event(session, event[0], user.id)
                         st.session_state.logged_in = True
                         st.session_state.user_id = user.id
                         st.session_state.username = user.username
+                        st.session_state.event_id = event[0]
+                        # Keeps the session across tabs and reloads (see sessions.py)
+                        st.session_state.session_token = sessions.issue(user.id, user.username)
+                        st.session_state.pending_cookie = st.session_state.session_token
                         st.rerun()
                     else:
                         st.error("Usuario o contraseña incorrectos")
@@ -526,6 +584,75 @@ def login_page():
                     st.rerun()
 
 
+def event_sidebar():
+    session = get_session()
+    user_id = st.session_state.user_id
+    if st.session_state.event_id is None:
+        # Logged in before events existed, or state restored without one
+        event = resolve_event(session)
+        join_event(session, event[0], user_id)
+        st.session_state.event_id = event[0]
+    events = user_events(session, user_id)
+    session.close()
+
+    names = {event_id: name for event_id, _, name in events}
+    if len(events) > 1:
+        ids = list(names)
+        current = ids.index(st.session_state.event_id) if st.session_state.event_id in ids else 0
+        chosen = st.selectbox("Evento", ids, index=current,
+                              format_func=names.get, key="event_select")
+        if chosen != st.session_state.event_id:
+            st.session_state.event_id = chosen
+            st.rerun()
+    else:
+        st.caption(names.get(st.session_state.event_id, ""))
+
+
+def snapshot_note():
+    # Staleness indicator for the group sections while snapshot mode is on
+    snapshot = snapshots.current()
+    if snapshot is not None and st.session_state.event_id in snapshot.events:
+        st.caption(f"📸 Datos de hace {snapshot.age():.0f} s · se actualizan cada {snapshots.interval:g} s")
+
+
+def admin_sidebar():
+    with st.expander("📈 Caché de datos del grupo"):
+        stats = aggregates.stats()
+        if stats:
+            st.table([{"Dato": key, "Evento": event_id, **values} for (key, event_id), values in stats.items()])
+        else:
+            st.caption("Sin lecturas aún.")
+
+    with st.expander("📸 Modo instantánea"):
+        on = st.toggle("Servir vistas del grupo desde instantánea", value=snapshots.enabled, key="snapshot_on")
+        if on != snapshots.enabled:
+            snapshots.set_enabled(on)
+        snapshots.interval = st.number_input("Actualizar cada (s)", min_value=1.0, max_value=300.0,
+                                             value=float(snapshots.interval), step=1.0, key="snapshot_interval")
+        snapshot = snapshots.current()
+        if snapshot is not None:
+            st.caption(f"Última: hace {snapshot.age():.1f} s, construida en {snapshot.build_time * 1000:.0f} ms")
+        elif on:
+            st.caption("Construyendo la primera instantánea…")
+        if snapshots.last_error:
+            st.error(f"Error al actualizar: {snapshots.last_error}")
+
+    with st.expander("⏱️ Rendimiento por página"):
+        on = st.toggle("Medir reruns", value=instrumentation.enabled, key="instrumentation_on")
+        if on != instrumentation.enabled:
+            instrumentation.set_enabled(on)
+        summary = instrumentation.summary()
+        if summary:
+            st.dataframe(summary, hide_index=True)
+            last = list(instrumentation.recent)[-10:]
+            st.caption("Últimos reruns")
+            st.dataframe([span.as_dict() for span in reversed(last)], hide_index=True)
+        else:
+            st.caption("Sin mediciones aún." if on else "La medición está apagada.")
+        if instrumentation.TRACE_FILE:
+            st.caption(f"Guardando spans en `{instrumentation.TRACE_FILE}`")
+
+
 # ----------------------------------------
 # Main Execution Flow
 # ----------------------------------------
@@ -536,18 +663,54 @@ except Exception as e:
     print(f"DB Init failed: {e}")
     pass
 
+def restore_session():
+    # A new tab or a reload: log in from the session cookie, if it still holds
+    # Tokens used to travel in the link; never honor or keep one there
+    st.query_params.pop("sesion", None)
+    token = st.context.cookies.to_dict().get(sessions.COOKIE_NAME)
+    if not token:
+        return
+    user = sessions.validate(token)
+    if user is None:
+        st.session_state.pending_cookie = ""
+        return
+    st.session_state.logged_in = True
+    st.session_state.user_id, st.session_state.username = user
+    st.session_state.session_token = token
+
+def write_session_cookie(token):
+    # Streamlit cannot set response headers, so the browser writes the cookie
+    max_age = sessions.SESSION_TTL if token else 0
+    st.html(
+        f"<script>document.cookie = '{sessions.COOKIE_NAME}={token}; Path=/; Max-Age={max_age}; SameSite=Strict'"
+        " + (location.protocol === 'https:' ? '; Secure' : '');</script>",
+        unsafe_allow_javascript=True,
+    )
+
+# Only a new session can have missed its login; later reruns skip the check
+if not st.session_state.logged_in and 'session_restored' not in st.session_state:
+    st.session_state.session_restored = True
+    restore_session()
+
+if st.session_state.pending_cookie is not None:
+    write_session_cookie(st.session_state.pending_cookie)
+    st.session_state.pending_cookie = None
+
 if not st.session_state.logged_in:
-    login_page()
+    traced(login_page)()
 else:
     # Sidebar Greeting
     with st.sidebar:
         st.title(f"Hola, {st.session_state.username} 👋")
+        event_sidebar()
+        if st.session_state.username == 'tengorio':
+            admin_sidebar()
 
     # Multipage Navigation
     pg = st.navigation([
-        st.Page(show_profile, title="Mi Perfil", icon="👤"),
-        st.Page(show_potluck, title="Comida (Potluck)", icon="🍲"),
-        st.Page(show_secretsanta, title="Intercambio (Secret Santa)", icon="🎁"),
+        st.Page(traced(show_profile), title="Mi Perfil", icon="👤"),
+        st.Page(traced(show_potluck), title="Comida (Potluck)", icon="🍲"),
+        st.Page(traced(show_secretsanta), title="Intercambio (Secret Santa)", icon="🎁"),
         st.Page(logout, title="Cerrar Sesión", icon="🚪"),
     ])
     pg.run()
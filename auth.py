@@ -0,0 +1,130 @@
+"""Password hashing and verification.
+
+Passwords are hashed with a salted, memory-hard KDF (scrypt by default,
+PBKDF2-SHA256 as an alternative) and stored as self-describing strings:
+
+    scrypt$<n>$<r>$<p>$<salt>$<hash>
+    pbkdf2_sha256$<iterations>$<salt>$<hash>
+
+Hashes from before this module (bare unsalted SHA-256 hex digests) still
+verify, and ``verify_password`` reports them as needing a rehash so the
+login flow can upgrade them transparently.
+
+Each KDF call costs tens of milliseconds of CPU. They run in a small shared
+thread pool (hashlib releases the GIL while hashing), so a burst of logins
+can use at most PASSWORD_HASH_WORKERS cores and the other sessions' reruns
+keep going. Successful verifications are remembered in a small in-memory
+LRU, so a user logging in again from another tab skips the KDF.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+PASSWORD_KDF = os.environ.get("PASSWORD_KDF", "scrypt")  # "scrypt" or "pbkdf2_sha256"
+SCRYPT_N = int(os.environ.get("SCRYPT_N", 2 ** 14))
+SCRYPT_R = int(os.environ.get("SCRYPT_R", 8))
+SCRYPT_P = int(os.environ.get("SCRYPT_P", 1))
+PBKDF2_ITERATIONS = int(os.environ.get("PBKDF2_ITERATIONS", 600_000))
+HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+VERIFY_CACHE_SIZE = int(os.environ.get("PASSWORD_VERIFY_CACHE_SIZE", 1024))
+
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="password-hash")
+
+# Keys are HMACs under a per-process secret, never the passwords themselves
+_cache_secret = secrets.token_bytes(32)
+_verified = OrderedDict()
+_verified_lock = threading.Lock()
+
+
+def _b64encode(raw):
+    return base64.b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _b64decode(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r * p, dklen=HASH_BYTES)
+
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations, dklen=HASH_BYTES)
+
+
+def hash_password_sync(password):
+    """Hash on the calling thread. Prefer hash_password() from page code."""
+    salt = secrets.token_bytes(SALT_BYTES)
+    if PASSWORD_KDF == "pbkdf2_sha256":
+        digest = _pbkdf2(password, salt, PBKDF2_ITERATIONS)
+        return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${_b64encode(salt)}${_b64encode(digest)}"
+    digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64encode(salt)}${_b64encode(digest)}"
+
+
+def verify_password_sync(password, stored):
+    """Check password against stored. Returns (ok, needs_rehash)."""
+    parts = stored.split("$")
+    try:
+        if parts[0] == "scrypt" and len(parts) == 6:
+            n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+            digest = _scrypt(password, _b64decode(parts[4]), n, r, p)
+            current = PASSWORD_KDF == "scrypt" and (n, r, p) == (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+            return hmac.compare_digest(digest, _b64decode(parts[5])), not current
+        if parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+            iterations = int(parts[1])
+            digest = _pbkdf2(password, _b64decode(parts[2]), iterations)
+            current = PASSWORD_KDF == "pbkdf2_sha256" and iterations == PBKDF2_ITERATIONS
+            return hmac.compare_digest(digest, _b64decode(parts[3])), not current
+    except ValueError:
+        return False, False
+    # Legacy: unsalted SHA-256 hex digest
+    legacy = hashlib.sha256(password.encode()).hexdigest()
+    return hmac.compare_digest(legacy, stored), True
+
+
+def _cache_key(password, stored):
+    return hmac.new(_cache_secret, f"{stored}\0{password}".encode(), hashlib.sha256).digest()
+
+
+def hash_password(password):
+    """Hash a new password in the worker pool, blocking until it is done."""
+    return _executor.submit(hash_password_sync, password).result()
+
+
+def verify_password(password, stored):
+    """Verify in the worker pool (or from the cache). Returns (ok, needs_rehash)."""
+    key = _cache_key(password, stored)
+    with _verified_lock:
+        if key in _verified:
+            _verified.move_to_end(key)
+            return True, False
+
+    ok, needs_rehash = _executor.submit(verify_password_sync, password, stored).result()
+    if ok and not needs_rehash and VERIFY_CACHE_SIZE > 0:
+        with _verified_lock:
+            _verified[key] = True
+            while len(_verified) > VERIFY_CACHE_SIZE:
+                _verified.popitem(last=False)
+    return ok, needs_rehash
+
+
+def hash_passwords(passwords, workers=None):
+    """Hash many passwords in parallel; results keep the input order.
+
+    Uses the shared pool unless workers is given, in which case a dedicated
+    pool of that size is used (e.g. for a bulk import on an idle machine).
+    """
+    if workers is None:
+        return list(_executor.map(hash_password_sync, passwords))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash-bulk") as pool:
+        return list(pool.map(hash_password_sync, passwords))
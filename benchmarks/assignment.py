@@ -0,0 +1,58 @@
+"""Potluck assignment engine vs. the old greedy Auto-Asignar loop.
+
+Usage: python -m benchmarks.assignment [--sizes 100 1000 5000]
+
+Generates synthetic groups where dish popularity is skewed (a few dishes
+everybody proposes, spelled inconsistently, plus a long tail) and reports
+run time, how many people each method leaves in conflict and how many
+assigned dishes are repeats once names are normalized (the greedy loop
+compares raw strings, so "Pozole" and "pozole " both get brought).
+"""
+import argparse
+import random
+import time
+
+from assignment import assign_dishes, greedy_assign, normalize_dish
+
+POPULAR = ["Pozole", "pozole ", "Tamales", "tamales", "Bacalao", "Romeritos", "Ponche", "Buñuelos", "Bunuelos"]
+
+
+def make_group(n, rng):
+    menu = POPULAR + [f"Platillo {k}" for k in range(n * 2)]
+    weights = [50] * len(POPULAR) + [1] * (len(menu) - len(POPULAR))
+    entries = [(i, rng.choices(menu, weights, k=3)) for i in range(n)]
+    votes = {(i, choice): rng.randint(0, 10) for i in range(n) for choice in (1, 2, 3) if rng.random() < 0.3}
+    return entries, votes
+
+
+def repeats(result):
+    keys = [normalize_dish(dish) for dish in result.values() if dish]
+    return len(keys) - len(set(keys))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    args = parser.parse_args()
+
+    rng = random.Random(2025)
+    print(f"{'people':>7} {'greedy ms':>10} {'conflicts':>10} {'repeats':>8} {'engine ms':>10} {'conflicts':>10} {'repeats':>8}")
+    for n in args.sizes:
+        entries, votes = make_group(n, rng)
+
+        start = time.perf_counter()
+        greedy = greedy_assign(entries)
+        greedy_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        optimal = assign_dishes(entries, votes)
+        engine_ms = (time.perf_counter() - start) * 1000
+
+        greedy_conflicts = sum(1 for dish in greedy.values() if dish is None)
+        engine_conflicts = sum(1 for dish in optimal.values() if dish is None)
+        print(f"{n:>7} {greedy_ms:>10.1f} {greedy_conflicts:>10} {repeats(greedy):>8} "
+              f"{engine_ms:>10.1f} {engine_conflicts:>10} {repeats(optimal):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Thundering-herd stress check for the Secret Santa market.
+
+Usage: python -m benchmarks.claim_stress [--threads 300] [--wishes 20]
+
+Starts many threads at once, each with its own session, all trying to claim
+wishes from a small pool on a local SQLite file. Checks that every wish ends
+up with exactly one owner and that exactly one claim per wish reported
+success. Exits with status 1 otherwise.
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import insert
+
+import db
+from db import User, Wish
+from queries import claim_wish
+from benchmarks.common import temp_database, default_event_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=300)
+    parser.add_argument("--wishes", type=int, default=20)
+    parser.add_argument("--attempts", type=int, default=3, help="claims per thread")
+    args = parser.parse_args()
+
+    with temp_database(copy_existing=False):
+        event_id = default_event_id()
+        session = db.get_session()
+        owner_id = args.threads + 1
+        session.execute(insert(User), [
+            {"id": uid, "username": f"user{uid}", "password_hash": "x"} for uid in range(1, owner_id + 1)
+        ])
+        session.execute(insert(Wish), [
+            {"event_id": event_id, "user_id": owner_id, "description": f"Regalo {k}"} for k in range(args.wishes)
+        ])
+        session.commit()
+        wish_ids = [wid for (wid,) in session.query(Wish.id)]
+        session.close()
+
+        barrier = threading.Barrier(args.threads)
+        wins = Counter()
+        errors = []
+        lock = threading.Lock()
+
+        def worker(user_id):
+            rng = random.Random(user_id)
+            barrier.wait()
+            for _ in range(args.attempts):
+                wish_id = rng.choice(wish_ids)
+                session = db.get_session()
+                try:
+                    if claim_wish(session, event_id, wish_id, user_id):
+                        with lock:
+                            wins[wish_id] += 1
+                except Exception as e:
+                    with lock:
+                        errors.append(repr(e))
+                finally:
+                    session.close()
+
+        threads = [threading.Thread(target=worker, args=(uid,)) for uid in range(1, args.threads + 1)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        session = db.get_session()
+        owners = dict(session.query(Wish.id, Wish.claimed_by_id))
+        session.close()
+
+    claims = args.threads * args.attempts
+    print(f"{claims} claims from {args.threads} threads in {elapsed:.2f}s ({claims / elapsed:.0f} claims/s)")
+    print(f"{len(wins)} wishes won, {sum(wins.values())} successful claims, {len(errors)} errors")
+
+    failures = []
+    for wish_id in wish_ids:
+        if wins[wish_id] > 1:
+            failures.append(f"wish {wish_id} reported {wins[wish_id]} winners")
+        if (owners[wish_id] is None) != (wins[wish_id] == 0):
+            failures.append(f"wish {wish_id} owner {owners[wish_id]} does not match {wins[wish_id]} wins")
+    failures.extend(errors[:5])
+    if failures:
+        print("FAIL:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("OK: every claimed wish has exactly one owner")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Helpers shared by the benchmark scripts.
+
+Benchmarks never touch reunion.db itself: they work on a temporary copy (or a
+fresh file) and point db.py at it through reset_engine().
+"""
+import contextlib
+import os
+import random
+import shutil
+import tempfile
+
+from sqlalchemy import event, insert
+
+import db
+from cache import aggregates
+from auth import hash_password_sync
+from db import User, Event, EventMember, Potluck, Wish, Vote
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+DISHES = ["Pozole", "Tamales", "Ensalada", "Bacalao", "Romeritos", "Ponche", "Pastel", "Buñuelos",
+          "Pierna", "Lasaña", "Sopa de fideo", "Guacamole", "Flan", "Galletas", "Pan dulce"]
+
+
+@contextlib.contextmanager
+def temp_database(copy_existing=True):
+    """Point db.py at a throwaway SQLite file for the duration of the block."""
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "reunion.db")
+    if copy_existing:
+        shutil.copy(os.path.join(os.path.dirname(APP_PATH), "reunion.db"), path)
+    url = f"sqlite:///{path}"
+    previous = os.environ.get("DATABASE_URL")
+    os.environ["DATABASE_URL"] = url  # for AppTest scripts, which import db themselves
+    db.reset_engine(url)
+    # Cached aggregates from an earlier temp database share its event ids
+    aggregates.clear()
+    try:
+        db.init_db()
+        yield url
+    finally:
+        db.reset_engine()
+        if previous is None:
+            os.environ.pop("DATABASE_URL", None)
+        else:
+            os.environ["DATABASE_URL"] = previous
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def default_event_id():
+    session = db.get_session()
+    try:
+        return session.query(Event.id).filter(Event.slug == db.DEFAULT_EVENT_SLUG).scalar()
+    finally:
+        session.close()
+
+
+def seed(n_users, wishes_per_user=2, votes_per_user=3, seed=0, event_id=None):
+    """Bulk-insert n_users members of an event with potluck options, wishes and votes.
+
+    event_id defaults to the default event. Returns the list of new user
+    ids. Every password is "secret".
+    """
+    rng = random.Random(seed)
+    event_id = event_id or default_event_id()
+    session = db.get_session()
+    first_id = (session.query(User.id).order_by(User.id.desc()).limit(1).scalar() or 0) + 1
+    user_ids = list(range(first_id, first_id + n_users))
+    password_hash = hash_password_sync("secret")
+    session.execute(insert(User), [
+        {"id": uid, "username": f"user{uid}", "password_hash": password_hash, "name": f"Amigo {uid}"}
+        for uid in user_ids
+    ])
+    session.execute(insert(EventMember), [{"event_id": event_id, "user_id": uid} for uid in user_ids])
+    session.execute(insert(Potluck), [
+        {"event_id": event_id, "user_id": uid, "dish_1": rng.choice(DISHES), "dish_2": rng.choice(DISHES), "dish_3": rng.choice(DISHES)}
+        for uid in user_ids
+    ])
+    wishes = [
+        {"event_id": event_id, "user_id": uid, "description": f"Regalo {k} de {uid}"}
+        for uid in user_ids for k in range(wishes_per_user)
+    ]
+    if wishes:
+        session.execute(insert(Wish), wishes)
+    potluck_ids = [pid for (pid,) in session.query(Potluck.id).filter(Potluck.event_id == event_id)]
+    votes = []
+    for uid in user_ids:
+        for pid in rng.sample(potluck_ids, min(votes_per_user, len(potluck_ids))):
+            votes.append({"event_id": event_id, "voter_id": uid, "potluck_id": pid, "dish_choice": rng.randint(1, 3)})
+    if votes:
+        session.execute(insert(Vote), votes)
+    session.commit()
+    session.close()
+    return user_ids
+
+
+@contextlib.contextmanager
+def count_statements(engine=None):
+    """Count SQL statements executed on the engine inside the block."""
+    engine = engine or db.get_engine()
+    counter = {"statements": 0}
+
+    def before_cursor_execute(*args):
+        counter["statements"] += 1
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def logged_in_app(page, user_id, username, timeout=60):
+    """An AppTest of app.py, logged in and sitting on the given page function."""
+    from streamlit.navigation.page import calc_hash
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    at.session_state.logged_in = True
+    at.session_state.user_id = user_id
+    at.session_state.username = username
+    at.run()
+    # Function pages registered with st.navigation are addressed by the hash
+    # of their url path, which defaults to the function name.
+    at._page_hash = calc_hash(page)
+    at.run()
+    return at
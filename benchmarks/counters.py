@@ -0,0 +1,71 @@
+"""Counter tables vs scanning the source rows.
+
+Usage: python -m benchmarks.counters [--users 2000] [--votes-per-user 100]
+
+Seeds a fresh database (the triggers fill the counters as rows go in), then
+times the vote and date aggregates read from the counter tables against the
+GROUP BY over every vote and availability row they replace. Exits with
+status 1 if counters.check() finds any drift.
+"""
+import argparse
+import datetime
+import random
+import sys
+import time
+
+from sqlalchemy import insert, text
+
+import counters
+import db
+from db import Availability
+from queries import vote_counts, group_date_counts
+from benchmarks.common import temp_database, seed, default_event_id
+
+
+def timed(func, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--votes-per-user", type=int, default=100)
+    parser.add_argument("--dates-per-user", type=int, default=10)
+    args = parser.parse_args()
+
+    with temp_database(copy_existing=False):
+        start = time.perf_counter()
+        user_ids = seed(args.users, wishes_per_user=0, votes_per_user=args.votes_per_user)
+        event_id = default_event_id()
+        rng = random.Random(0)
+        days = [datetime.date(2025, 12, 1) + datetime.timedelta(days=d) for d in range(60)]
+        session = db.get_session()
+        session.execute(insert(Availability), [
+            {"event_id": event_id, "user_id": uid, "date": day} for uid in user_ids for day in rng.sample(days, args.dates_per_user)
+        ])
+        session.commit()
+        seeded = time.perf_counter() - start
+
+        with db.get_engine().connect() as conn:
+            n_votes = conn.execute(text("SELECT COUNT(*) FROM votes")).scalar()
+            scan_votes = timed(lambda: conn.execute(text(counters._sql(counters.VOTE_COUNTS_SQL))).all())
+            scan_dates = timed(lambda: conn.execute(text(counters._sql(counters.DATE_COUNTS_SQL))).all())
+            drift = counters.check(conn)
+        read_votes = timed(lambda: vote_counts(session, event_id))
+        read_dates = timed(lambda: group_date_counts(session, event_id))
+        session.close()
+
+    print(f"{args.users} users, {n_votes} votes seeded (with triggers) in {seeded:.1f}s")
+    print(f"vote counts:  {scan_votes:8.2f} ms scanning votes   {read_votes:8.2f} ms from vote_totals")
+    print(f"date counts:  {scan_dates:8.2f} ms scanning dates   {read_dates:8.2f} ms from date_totals")
+    if drift:
+        print("FAIL:\n  " + "\n  ".join(drift[:20]))
+        sys.exit(1)
+    print("OK: counters match the source rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Reruns per second: pooled engine vs. building an engine on every call.
+
+Usage: python -m benchmarks.engine [--reruns 500]
+
+Each "rerun" opens a session and issues the same lookups a logged-in page
+render does, against a temporary copy of reunion.db.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import db
+from db import User, Potluck, Wish
+
+
+def simulate_rerun(session, user_id):
+    session.query(User).filter(User.id == user_id).first()
+    session.query(Potluck).filter(Potluck.event_id == 1, Potluck.user_id == user_id).first()
+    session.query(Wish).filter(Wish.event_id == 1, Wish.user_id == user_id).all()
+    session.close()
+
+
+def legacy_session(url):
+    # What get_session() did before: a fresh engine and sessionmaker per call
+    engine = create_engine(url)
+    return sessionmaker(bind=engine)()
+
+
+def run(label, make_session, reruns):
+    start = time.perf_counter()
+    for i in range(reruns):
+        simulate_rerun(make_session(), i % 10 + 1)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {reruns / elapsed:10.1f} reruns/s  ({elapsed * 1000 / reruns:.2f} ms/rerun)")
+    return reruns / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reruns", type=int, default=500)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "reunion.db")
+    shutil.copy("reunion.db", path)
+    url = f"sqlite:///{path}"
+    try:
+        db.reset_engine(url)
+        db.init_db()
+        legacy = run("legacy", lambda: legacy_session(url), args.reruns)
+        pooled = run("pooled", db.get_session, args.reruns)
+        print(f"speedup    {pooled / legacy:10.1f}x")
+    finally:
+        db.reset_engine()
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""SQL statements and CPU per interaction: full rerun vs. fragment rerun.
+
+Usage: python -m benchmarks.fragments [--users 200]
+
+For each interaction (vote, add a date, claim a wish, next market page)
+this clicks the button through AppTest and records two costs:
+
+- full: every statement and the process CPU of the whole script rerun(s)
+  the click causes, which is what every click cost before the fragments;
+- fragment: the statements and thread CPU recorded by instrumentation for
+  the fragment function alone, which is all a fragment rerun executes.
+
+AppTest always reruns the whole script (it has no fragment reruns), so the
+fragment column is measured from the fragment's own span inside that run.
+Exits with status 1 if a fragment is not cheaper than the full rerun.
+"""
+import argparse
+import sys
+import time
+
+import instrumentation
+from benchmarks.common import temp_database, seed, count_statements, logged_in_app
+
+# (interaction, page, fragment, prefix of the button key to click)
+INTERACTIONS = [
+    ("vote", "show_potluck", "vote_cards", "v_"),
+    ("add_date", "show_profile", "availability", "add_date"),
+    ("claim_wish", "show_secretsanta", "market", "claim_"),
+    ("market_page", "show_secretsanta", "market", "market_next"),
+]
+
+
+def click(at, prefix):
+    button = next(b for b in at.button if b.key and b.key.startswith(prefix))
+    button.click()
+
+
+def measure(page, fragment, prefix, user_id):
+    at = logged_in_app(page, user_id, "amigo")
+    assert not at.exception, at.exception
+    instrumentation.recent.clear()
+    click(at, prefix)
+    with count_statements() as counter:
+        cpu_start = time.process_time()
+        at.run()
+        cpu = time.process_time() - cpu_start
+    assert not at.exception, at.exception
+    spans = [s for s in instrumentation.recent if s.name == fragment]
+    return {
+        "full_sql": counter["statements"],
+        "full_cpu": cpu * 1000,
+        "fragment_sql": sum(s.statements for s in spans),
+        "fragment_cpu": sum(s.cpu for s in spans) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args()
+
+    instrumentation.set_enabled(True)
+    failures = []
+    print(f"{'interaction':<12} {'full SQL':>9} {'frag SQL':>9} {'full CPU ms':>12} {'frag CPU ms':>12}")
+    with temp_database(copy_existing=False):
+        user_ids = seed(args.users)
+        for name, page, fragment, prefix in INTERACTIONS:
+            r = measure(page, fragment, prefix, user_ids[0])
+            print(f"{name:<12} {r['full_sql']:>9} {r['fragment_sql']:>9} {r['full_cpu']:>12.1f} {r['fragment_cpu']:>12.1f}")
+            if r["fragment_sql"] >= r["full_sql"]:
+                failures.append(f"{name}: fragment issues {r['fragment_sql']} statements, full rerun {r['full_sql']}")
+    instrumentation.set_enabled(False)
+
+    if failures:
+        print("FAIL:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("OK: every fragment rerun is cheaper than the full rerun")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Live refresh: cost of an idle session polling data versions vs. refreshing.
+
+Usage: python -m benchmarks.live_refresh [--users 200] [--polls 2000]
+
+First checks that every write helper bumps the data version of its area,
+with the write queue off and on, and that a change noticed by many polling
+sessions drops the process's cached aggregates once. Then times
+versions.current(), the one
+read an idle page makes per tick, and counts the statements of a full
+rerun of the potluck and Secret Santa pages through AppTest, which is
+what each manual refresh costs (with the shared aggregates cached, and
+reloaded as after a change). Reports the database statements per idle
+session per minute both ways at LIVE_REFRESH_SECONDS. Exits with status 1
+if a write does not bump its area or a poll takes more than one statement.
+"""
+import argparse
+import datetime
+import sys
+import time
+
+import db
+import versions
+from cache import aggregates, AVAILABILITY, POTLUCKS, VOTES, WISHES
+from queries import (
+    add_date, remove_date, save_potluck, save_assignments, cast_vote,
+    add_wish, claim_wish, release_wish, cached_open_wishes, cached_potluck_table,
+)
+from writequeue import write_queue
+from benchmarks.common import temp_database, seed, count_statements, default_event_id, logged_in_app
+
+
+def writes(session, event_id, user_id, other_id):
+    """(name, area, write) for every write helper a page uses."""
+    day = datetime.date(2030, 1, 1)
+    potluck_id = cached_potluck_table(session, event_id)[0]["id"]
+    wish_id = lambda: next(w["id"] for w in cached_open_wishes(session, event_id) if w["user_id"] == other_id)
+    claimed = {}
+    return [
+        ("add_date", AVAILABILITY, lambda: add_date(session, event_id, user_id, day)),
+        ("remove_date", AVAILABILITY, lambda: remove_date(session, event_id, user_id, day)),
+        ("save_potluck", POTLUCKS, lambda: save_potluck(session, event_id, user_id, "Pozole", "", "")),
+        ("save_assignments", POTLUCKS, lambda: save_assignments(session, event_id, {potluck_id: "Pozole"})),
+        ("cast_vote", VOTES, lambda: cast_vote(session, event_id, user_id, potluck_id, 2)),
+        ("add_wish", WISHES, lambda: add_wish(session, event_id, user_id, "Un libro")),
+        ("claim_wish", WISHES, lambda: claim_wish(session, event_id, claimed.setdefault("id", wish_id()), user_id)),
+        ("release_wish", WISHES, lambda: release_wish(session, event_id, claimed["id"], user_id)),
+    ]
+
+
+def check_bumps(event_id, user_ids):
+    failures = []
+    session = db.get_session()
+    try:
+        for name, area, write in writes(session, event_id, *user_ids[:2]):
+            before = versions.current(session, event_id)
+            write()
+            session.expire_all()
+            after = versions.current(session, event_id)
+            moved = {a for a in versions.AREAS if after[a] != before[a]}
+            if moved != {area}:
+                failures.append(f"{name}: moved {sorted(moved) or 'nothing'}, expected {area}")
+    finally:
+        session.close()
+    return failures
+
+
+def check_catch_up(event_id, user_id, sessions=50):
+    """Polls of many sessions after one write invalidate the cache once."""
+    invalidated = []
+    aggregates.subscribe(lambda *keys: invalidated.extend(keys))
+    session = db.get_session()
+    try:
+        versions.catch_up(event_id, versions.current(session, event_id))
+        cast_vote(session, event_id, user_id, cached_potluck_table(session, event_id)[1]["id"], 1)
+        invalidated.clear()  # the write's own invalidation
+        for _ in range(sessions):
+            versions.catch_up(event_id, versions.current(session, event_id))
+    finally:
+        session.close()
+    if invalidated != [(VOTES, event_id)]:
+        return [f"{sessions} polls after one vote invalidated {invalidated}, expected one {VOTES} entry"]
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--polls", type=int, default=2000)
+    args = parser.parse_args()
+
+    failures = []
+    with temp_database(copy_existing=False):
+        user_ids = seed(args.users)
+        event_id = default_event_id()
+
+        for label, queued in [("direct", False), ("write queue", True)]:
+            write_queue.enabled = queued
+            try:
+                failures += [f"{label}: {f}" for f in check_bumps(event_id, user_ids)]
+            finally:
+                write_queue.enabled = False
+        failures += check_catch_up(event_id, user_ids[0])
+
+        session = db.get_session()
+        try:
+            with count_statements() as counter:
+                start = time.perf_counter()
+                for _ in range(args.polls):
+                    versions.current(session, event_id)
+                poll_ms = (time.perf_counter() - start) * 1000 / args.polls
+        finally:
+            session.close()
+        poll_sql = counter["statements"] / args.polls
+        if poll_sql != 1:
+            failures.append(f"a poll took {poll_sql} statements")
+
+        ticks = 60 / versions.LIVE_REFRESH_SECONDS if versions.LIVE_REFRESH_SECONDS else 0
+        print(f"poll: {poll_ms:.3f} ms, {poll_sql:g} SQL; {ticks:g} ticks/min at {versions.LIVE_REFRESH_SECONDS:g} s")
+        print(f"{'page':<18} {'SQL/refresh':>12} {'(cold cache)':>13} {'SQL/min refreshing':>19} {'SQL/min polling':>16}")
+        for page in ("show_potluck", "show_secretsanta"):
+            at = logged_in_app(page, user_ids[0], "amigo")
+            assert not at.exception, at.exception
+            with count_statements() as warm:
+                at.run()
+            aggregates.clear()
+            with count_statements() as cold:
+                at.run()
+            print(f"{page:<18} {warm['statements']:>12} {cold['statements']:>13} "
+                  f"{warm['statements'] * ticks:>19g} {poll_sql * ticks:>16g}")
+
+    if failures:
+        print("FAIL:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("OK: every write bumps its area and an idle tick is one read")
+
+
+if __name__ == "__main__":
+    main()
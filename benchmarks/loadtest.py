@@ -0,0 +1,286 @@
+"""Headless load test: N simulated reunion users against a copy of reunion.db.
+
+Usage:
+    python -m benchmarks.loadtest [--users 200] [--think 1.0] [--ramp 5]
+                                  [--snapshot] [--out report.json] [--baseline old.json]
+
+Each virtual user is a thread that walks the evening's usual path with
+random think times in between: register, log in, open the profile and add
+dates, open the potluck page and save options, vote, open the gift market,
+add a wish and claim one. A step is timed the way a user feels it: the
+write (if any) plus the rerun that follows, i.e. the same reads the page
+function performs, or only the fragment's reads for clicks inside one (see
+PAGE_READS, which mirrors app.py).
+
+AppTest cannot run several scripts at once in one process, so the driver
+calls the app's data layer (queries.py, auth.py) directly; Streamlit's own
+element serialization is not included in the numbers.
+
+The report has p50/p95/p99 latency, throughput and error counts per step,
+with "database is locked" errors counted separately. With --out it is
+written as JSON; with --baseline the run is compared against an earlier
+report. --snapshot serves the group views from the background snapshot
+(snapshot.py) instead of the live database.
+"""
+import argparse
+import datetime
+import json
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy.exc import OperationalError
+
+import db
+from auth import hash_password, verify_password
+from db import User
+from queries import (
+    join_event, user_dates, add_date, cached_group_date_counts,
+    own_potluck, save_potluck, cached_potluck_table, my_votes, cached_vote_counts, cast_vote,
+    my_wishes, my_claims, add_wish, cached_open_wishes, claim_wish,
+)
+from snapshot import snapshots
+from benchmarks.common import temp_database, default_event_id, DISHES
+
+# The reads each page function does on every rerun, in app.py order
+PAGE_READS = {
+    "profile": lambda session, event_id, user_id: (
+        user_dates(session, event_id, user_id),
+        cached_group_date_counts(session, event_id),
+    ),
+    "potluck": lambda session, event_id, user_id: (
+        own_potluck(session, event_id, user_id),
+        cached_potluck_table(session, event_id),
+        my_votes(session, event_id, user_id),
+        cached_vote_counts(session, event_id),
+    ),
+    "market": lambda session, event_id, user_id: (
+        my_wishes(session, event_id, user_id),
+        cached_open_wishes(session, event_id),
+        my_claims(session, event_id, user_id),
+    ),
+    # Fragments: what a click inside one reruns
+    "availability": lambda session, event_id, user_id: (
+        user_dates(session, event_id, user_id),
+        cached_group_date_counts(session, event_id),
+    ),
+    "vote_cards": lambda session, event_id, user_id: (
+        cached_potluck_table(session, event_id),
+        my_votes(session, event_id, user_id),
+        cached_vote_counts(session, event_id),
+    ),
+    "market_list": lambda session, event_id, user_id: (
+        cached_open_wishes(session, event_id),
+        my_claims(session, event_id, user_id),
+    ),
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock_errors = defaultdict(int)
+
+    def step(self, name, func):
+        start = time.perf_counter()
+        try:
+            return func()
+        except OperationalError as e:
+            with self.lock:
+                if "locked" in str(e.orig):
+                    self.lock_errors[name] += 1
+                else:
+                    self.errors[name] += 1
+        except Exception:
+            with self.lock:
+                self.errors[name] += 1
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.latencies[name].append(elapsed)
+
+    def report(self, duration):
+        steps = {}
+        for name in sorted(self.latencies):
+            values = sorted(self.latencies[name])
+            steps[name] = {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+                "mean_ms": round(statistics.fmean(values) * 1000, 2),
+                "errors": self.errors[name],
+                "lock_errors": self.lock_errors[name],
+            }
+        total = sum(s["count"] for s in steps.values())
+        return {
+            "duration_s": round(duration, 2),
+            "steps_total": total,
+            "throughput_steps_per_s": round(total / duration, 2) if duration else 0,
+            "errors_total": sum(self.errors.values()),
+            "lock_errors_total": sum(self.lock_errors.values()),
+            "steps": steps,
+        }
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def rerun(page, event_id, user_id):
+    session = db.get_session()
+    try:
+        return PAGE_READS[page](session, event_id, user_id)
+    finally:
+        session.close()
+
+
+def write_then_rerun(page, event_id, user_id, write):
+    session = db.get_session()
+    try:
+        result = write(session)
+    finally:
+        session.close()
+    rerun(page, event_id, user_id)
+    return result
+
+
+def virtual_user(index, args, recorder, event_id):
+    rng = random.Random(args.seed * 100_003 + index)
+
+    def think():
+        time.sleep(rng.expovariate(1 / args.think) if args.think > 0 else 0)
+
+    time.sleep(rng.uniform(0, args.ramp))
+    username = f"load{index}"
+
+    def register():
+        session = db.get_session()
+        try:
+            if session.query(User).filter(User.username == username).first():
+                return None
+            user = User(username=username, password_hash=hash_password("secret"), name=f"Carga {index}")
+            session.add(user)
+            session.commit()
+            return user.id
+        finally:
+            session.close()
+
+    def login():
+        session = db.get_session()
+        try:
+            user = session.query(User).filter(User.username == username).first()
+            ok, _ = verify_password("secret", user.password_hash)
+            if not ok:
+                return None
+            join_event(session, event_id, user.id)
+            return user.id
+        finally:
+            session.close()
+
+    recorder.step("register", register)
+    think()
+    user_id = recorder.step("login", login)
+    if user_id is None:
+        return
+    think()
+
+    recorder.step("view_profile", lambda: rerun("profile", event_id, user_id))
+    for _ in range(2):
+        think()
+        day = datetime.date(2025, 12, 1) + datetime.timedelta(days=rng.randrange(31))
+        recorder.step("add_date", lambda: write_then_rerun(
+            "availability", event_id, user_id, lambda s: add_date(s, event_id, user_id, day)))
+
+    think()
+    recorder.step("view_potluck", lambda: rerun("potluck", event_id, user_id))
+    think()
+    dishes = rng.sample(DISHES, 3)
+    recorder.step("save_potluck", lambda: write_then_rerun(
+        "potluck", event_id, user_id, lambda s: save_potluck(s, event_id, user_id, *dishes)))
+    for _ in range(args.votes):
+        think()
+        table = rerun("potluck", event_id, user_id)[1]
+        if table:
+            target = rng.choice(table)
+            recorder.step("vote", lambda: write_then_rerun(
+                "vote_cards", event_id, user_id, lambda s: cast_vote(s, event_id, user_id, target["id"], rng.randint(1, 3))))
+
+    think()
+    recorder.step("view_market", lambda: rerun("market", event_id, user_id))
+    think()
+    recorder.step("add_wish", lambda: write_then_rerun(
+        "market", event_id, user_id, lambda s: add_wish(s, event_id, user_id, f"Deseo de {username}")))
+    think()
+    open_wishes = [w for w in rerun("market", event_id, user_id)[1] if w["user_id"] != user_id]
+    if open_wishes:
+        wish = rng.choice(open_wishes)
+        recorder.step("claim_wish", lambda: write_then_rerun(
+            "market_list", event_id, user_id, lambda s: claim_wish(s, event_id, wish["id"], user_id)))
+
+
+def compare(report, baseline):
+    print(f"\n{'step':<14} {'p95 before':>11} {'p95 now':>9} {'change':>8}")
+    for name, now in report["steps"].items():
+        before = baseline["steps"].get(name)
+        if not before:
+            continue
+        change = (now["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0
+        print(f"{name:<14} {before['p95_ms']:>11.1f} {now['p95_ms']:>9.1f} {change:>+8.0%}")
+    print(f"{'throughput':<14} {baseline['throughput_steps_per_s']:>11.1f} {report['throughput_steps_per_s']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--think", type=float, default=1.0, help="mean think time in seconds (0 = none)")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which users arrive")
+    parser.add_argument("--votes", type=int, default=3, help="votes cast per user")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--snapshot", action="store_true", help="turn on snapshot mode")
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    recorder = Recorder()
+    with temp_database():
+        if args.snapshot:
+            snapshots.set_enabled(True)
+        event_id = default_event_id()
+        threads = [threading.Thread(target=virtual_user, args=(i, args, recorder, event_id)) for i in range(args.users)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        duration = time.perf_counter() - start
+        snapshots.set_enabled(False)
+
+    report = recorder.report(duration)
+    report["config"] = {k: v for k, v in vars(args).items() if k not in ("out", "baseline")}
+
+    print(f"{args.users} users, {report['steps_total']} steps in {report['duration_s']}s "
+          f"({report['throughput_steps_per_s']} steps/s), {report['errors_total']} errors, "
+          f"{report['lock_errors_total']} lock errors")
+    print(f"{'step':<14} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'locked':>7}")
+    for name, s in report["steps"].items():
+        print(f"{name:<14} {s['count']:>6} {s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f} "
+              f"{s['errors']:>7} {s['lock_errors']:>7}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Login throughput with N users logging in at the same time.
+
+Usage: python -m benchmarks.login [--users 1 10 50]
+
+Every simulated user runs the login handler's work: look up the User row
+and verify the password through auth.verify_password (KDF in the worker
+pool). The "cold" round starts with an empty verification cache; the
+"tab" round repeats the same logins with the cache warm, like a user
+opening a second tab.
+While logins run, a probe thread times a cheap query to show how much the
+burst slows down everybody else's reruns.
+"""
+import argparse
+import statistics
+import threading
+import time
+
+import auth
+import db
+from db import User
+from benchmarks.common import temp_database, seed
+
+
+def login(username):
+    session = db.get_session()
+    try:
+        user = session.query(User).filter(User.username == username).first()
+        ok, _ = auth.verify_password("secret", user.password_hash)
+        assert ok
+    finally:
+        session.close()
+
+
+def probe(stop, samples):
+    while not stop.is_set():
+        start = time.perf_counter()
+        session = db.get_session()
+        session.query(User.id).limit(1).all()
+        session.close()
+        samples.append(time.perf_counter() - start)
+        time.sleep(0.005)
+
+
+def burst(usernames):
+    latencies = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(usernames))
+
+    def worker(username):
+        barrier.wait()
+        start = time.perf_counter()
+        login(username)
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    stop, probe_samples = threading.Event(), []
+    prober = threading.Thread(target=probe, args=(stop, probe_samples))
+    prober.start()
+    threads = [threading.Thread(target=worker, args=(u,)) for u in usernames]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    prober.join()
+    return elapsed, latencies, probe_samples
+
+
+def pct(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 10, 50])
+    args = parser.parse_args()
+
+    print(f"KDF={auth.PASSWORD_KDF} workers={auth.HASH_WORKERS}")
+    print(f"{'users':>6} {'mode':>5} {'logins/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'probe p95 ms':>13}")
+    with temp_database(copy_existing=False):
+        user_ids = seed(max(args.users), wishes_per_user=0, votes_per_user=0)
+        usernames = [f"user{uid}" for uid in user_ids]
+        # Distinct salts per user, otherwise the verification cache would
+        # turn every login after the first into a hit
+        session = db.get_session()
+        for user in session.query(User).filter(User.id.in_(user_ids)):
+            user.password_hash = auth.hash_password_sync("secret")
+        session.commit()
+        session.close()
+        for n in args.users:
+            auth._verified.clear()
+            for mode in ("cold", "tab"):
+                elapsed, latencies, probes = burst(usernames[:n])
+                print(f"{n:>6} {mode:>5} {n / elapsed:>9.1f} {pct(latencies, 50) * 1000:>8.1f} "
+                      f"{pct(latencies, 95) * 1000:>8.1f} {pct(probes, 95) * 1000 if probes else 0:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Elements and rerun time of the market and vote pages vs. group size.
+
+Usage: python -m benchmarks.page_elements [--sizes 10 100 1000]
+
+Renders show_potluck and show_secretsanta through AppTest for growing
+numbers of participants, once with the default page sizes and once with
+paging turned off (page size 0, everything on one page), and reports the
+number of Streamlit elements, their encoded size and the rerun time.
+With paging on, the element count must stay flat as the group grows;
+exits with status 1 if it does not.
+"""
+import argparse
+import sys
+import time
+
+import paging
+from benchmarks.common import temp_database, seed, logged_in_app
+
+PAGES = ["show_potluck", "show_secretsanta"]
+
+
+def walk(node):
+    """(elements, encoded bytes) under an AppTest tree node."""
+    children = getattr(node, "children", None)
+    if children is None:
+        proto = getattr(node, "proto", None)
+        return 1, proto.ByteSize() if proto is not None else 0
+    count, size = 1, 0
+    for child in children.values():
+        c, s = walk(child)
+        count += c
+        size += s
+    return count, size
+
+
+def measure(page, user_id, reruns):
+    at = logged_in_app(page, user_id, "tengorio")
+    assert not at.exception, at.exception
+    start = time.perf_counter()
+    for _ in range(reruns):
+        at.run()
+    elapsed = (time.perf_counter() - start) / reruns
+    assert not at.exception, at.exception
+    elements, size = walk(at._tree)
+    return elements, size, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--reruns", type=int, default=3)
+    args = parser.parse_args()
+
+    defaults = paging.MARKET_PAGE_SIZE, paging.VOTE_PAGE_SIZE
+    paged_counts = {page: set() for page in PAGES}
+    print(f"{'page':<18} {'users':>6} {'mode':<8} {'elements':>9} {'KB':>8} {'ms/rerun':>9}")
+    for n in args.sizes:
+        with temp_database(copy_existing=False):
+            user_ids = seed(n)
+            for page in PAGES:
+                for mode, sizes in [("all", (0, 0)), ("paged", defaults)]:
+                    paging.MARKET_PAGE_SIZE, paging.VOTE_PAGE_SIZE = sizes
+                    elements, size, elapsed = measure(page, user_ids[0], args.reruns)
+                    if mode == "paged" and n > max(defaults):
+                        paged_counts[page].add(elements)
+                    print(f"{page:<18} {n:>6} {mode:<8} {elements:>9} {size / 1024:>8.1f} {elapsed * 1000:>9.1f}")
+    paging.MARKET_PAGE_SIZE, paging.VOTE_PAGE_SIZE = defaults
+
+    growing = [page for page, counts in paged_counts.items() if len(counts) > 1]
+    if growing:
+        print(f"FAIL: element count grows with the group on {', '.join(growing)}")
+        sys.exit(1)
+    print("OK: paged element count does not depend on the group size")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Query-count regression check for the potluck page.
+
+Usage: python -m benchmarks.potluck_queries [--sizes 5 50 500]
+
+Renders show_potluck through AppTest with the aggregate cache turned off
+and counts the SQL statements of one rerun for growing numbers of users.
+The count must not depend on the group size; exits with status 1 if it does.
+"""
+import argparse
+import sys
+import time
+
+from cache import aggregates
+from benchmarks.common import temp_database, seed, count_statements, logged_in_app
+
+
+def measure(n_users):
+    with temp_database(copy_existing=False):
+        user_ids = seed(n_users)
+        at = logged_in_app("show_potluck", user_ids[0], "tengorio")
+        assert not at.exception, at.exception
+        with count_statements() as counter:
+            start = time.perf_counter()
+            at.run()
+            elapsed = time.perf_counter() - start
+        assert not at.exception, at.exception
+        return counter["statements"], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 50, 500])
+    args = parser.parse_args()
+
+    aggregates.enabled = False
+    counts = set()
+    for n in args.sizes:
+        statements, elapsed = measure(n)
+        counts.add(statements)
+        print(f"{n:>6} users  {statements:>3} statements  {elapsed * 1000:8.1f} ms/rerun")
+
+    if len(counts) != 1:
+        print("FAIL: statement count grows with the number of users")
+        sys.exit(1)
+    print("OK: constant statement count")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Best-date recommender: build and query time up to tens of thousands of users.
+
+Usage: python -m benchmarks.recommend [--users 1000 10000 30000] [--days 365]
+
+Generates groups where each user marks a few clusters of days across a
+year, builds the bit matrix from (user_id, date) rows and times the three
+questions: best date, best 2/3/7-day windows and the best date for a
+required tenth of the group. For comparison it also times the best
+3-day window the plain-Python way (a set of users per date, intersected
+window by window). Results are checked against that brute force for the
+smaller groups.
+
+Then, on a temporary database, times queries.availability_matrix on a
+miss (SQL load plus build) and on a hit, and checks that add_date drops
+the cached matrix. Exits with status 1 on a wrong answer.
+"""
+import argparse
+import datetime
+import random
+import sys
+import time
+
+import db
+from db import Availability
+from queries import availability_matrix, add_date
+from recommend import AvailabilityMatrix
+from benchmarks.common import temp_database, seed, default_event_id
+
+START = datetime.date(2026, 1, 1)
+
+
+def make_rows(n_users, days, rng):
+    rows = set()
+    for user_id in range(1, n_users + 1):
+        for _ in range(rng.randint(1, 4)):
+            first = rng.randrange(days)
+            for day in range(first, min(first + rng.randint(1, 10), days)):
+                rows.add((user_id, START + datetime.timedelta(days=day)))
+    return list(rows)
+
+
+def ms_since(start):
+    return (time.perf_counter() - start) * 1000
+
+
+def python_best_window(rows, length):
+    # The straightforward way: one set of users per date, intersected per window
+    by_date = {}
+    for user_id, date in rows:
+        by_date.setdefault(date, set()).add(user_id)
+    first, last = min(by_date), max(by_date)
+    best = (-1, None)
+    for offset in range((last - first).days - length + 2):
+        days = [first + datetime.timedelta(days=offset + k) for k in range(length)]
+        full = set.intersection(*(by_date.get(d, set()) for d in days))
+        best = max(best, (len(full), days[0]), key=lambda b: b[0])
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000, 30000])
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+
+    rng = random.Random(2025)
+    failures = []
+    print(f"{'users':>7} {'rows':>8} {'build ms':>9} {'date ms':>8} {'windows ms':>11} "
+          f"{'required ms':>12} {'python 3-day ms':>16} {'matrix KB':>10}")
+    for n in args.users:
+        rows = make_rows(n, args.days, rng)
+        start = time.perf_counter()
+        matrix = AvailabilityMatrix(rows)
+        build_ms = ms_since(start)
+
+        start = time.perf_counter()
+        best = matrix.best_dates(1)
+        date_ms = ms_since(start)
+
+        start = time.perf_counter()
+        windows = {length: matrix.best_windows(length, 1) for length in (2, 3, 7)}
+        windows_ms = ms_since(start)
+
+        required = set(rng.sample(range(1, n + 1), n // 10))
+        start = time.perf_counter()
+        matrix.covering_dates(required, 1)
+        required_ms = ms_since(start)
+
+        start = time.perf_counter()
+        expected_full, _ = python_best_window(rows, 3)
+        python_ms = ms_since(start)
+
+        print(f"{n:>7} {len(rows):>8} {build_ms:>9.1f} {date_ms:>8.2f} {windows_ms:>11.2f} "
+              f"{required_ms:>12.2f} {python_ms:>16.1f} {matrix.bits.nbytes / 1024:>10.0f}")
+        if windows[3][0][1] != expected_full:
+            failures.append(f"{n} users: best 3-day window has {windows[3][0][1]} people, expected {expected_full}")
+        counts = {}
+        for _, date in rows:
+            counts[date] = counts.get(date, 0) + 1
+        if best[0][1] != max(counts.values()):
+            failures.append(f"{n} users: best date has {best[0][1]} people, expected {max(counts.values())}")
+
+    with temp_database(copy_existing=False):
+        n = 2000
+        user_ids = seed(n, wishes_per_user=0, votes_per_user=0)
+        event_id = default_event_id()
+        session = db.get_session()
+        try:
+            shifted = {(user_ids[0] + u - 1, date) for u, date in make_rows(n, args.days, rng)}
+            session.execute(Availability.__table__.insert(), [
+                {"event_id": event_id, "user_id": u, "date": date} for u, date in shifted
+            ])
+            session.commit()
+
+            start = time.perf_counter()
+            before = availability_matrix(session, event_id)
+            miss_ms = ms_since(start)
+            start = time.perf_counter()
+            hit = availability_matrix(session, event_id)
+            hit_ms = ms_since(start)
+            print(f"availability_matrix, {n} users / {len(shifted)} rows: miss {miss_ms:.1f} ms, hit {hit_ms:.3f} ms")
+            if hit is not before:
+                failures.append("a second read rebuilt the matrix")
+
+            # A date nobody had, one day before the rest: must show up at once
+            new_date = START - datetime.timedelta(days=1)
+            add_date(session, event_id, user_ids[0], new_date)
+            after = availability_matrix(session, event_id)
+            if after is before or after.date(0) != new_date:
+                failures.append("add_date did not drop the cached matrix")
+        finally:
+            session.close()
+
+    if failures:
+        print("FAIL:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("OK: recommendations match the brute force and the cache follows writes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Secret Santa draw: run time across group sizes and exclusion densities.
+
+Usage: python -m benchmarks.santa [--sizes 100 1000 5000] [--densities 0 2 20 200]
+
+For each group size and number of exclusions per person, excludes couples
+(both directions), last year's pairs and that many random receivers per
+giver, draws, and checks the result is a complete draw that breaks no
+rule. Then runs two edge cases: a group where everyone may give to just
+two people (the random swaps cannot fix that, so the matching fallback has
+to) and one with no possible draw, which must raise ValueError. Last, a
+draw through queries.draw_santa on a temporary database, timed with the
+bulk save and counted in SQL statements. Exits with status 1 on any
+invalid draw.
+"""
+import argparse
+import random
+import sys
+import time
+
+import db
+import santa
+from db import Wish
+from queries import draw_santa, claimed_pairs, santa_pairs, claim_wish
+from benchmarks.common import temp_database, seed, count_statements, default_event_id
+
+
+def make_exclusions(people, per_person, rng):
+    excluded = set()
+    # Couples: consecutive ids, excluded both ways
+    for a, b in zip(people[::2], people[1::2]):
+        excluded.update({(a, b), (b, a)})
+    # Last year's pairs: a random circle, each gives to the next
+    order = people[:]
+    rng.shuffle(order)
+    excluded.update(zip(order, order[1:] + order[:1]))
+    for giver in people:
+        for receiver in rng.sample(people, min(per_person, len(people))):
+            excluded.add((giver, receiver))
+    return excluded
+
+
+def problems(people, excluded, pairs, fixed=None):
+    found = []
+    if sorted(pairs) != people or sorted(pairs.values()) != people:
+        found.append("not everyone gives and receives exactly once")
+    bad = [(g, r) for g, r in pairs.items() if g == r or (g, r) in excluded]
+    if bad:
+        found.append(f"{len(bad)} forbidden pairs, e.g. {bad[0]}")
+    if fixed and any(pairs.get(g) != r for g, r in fixed.items()):
+        found.append("a fixed pair was not kept")
+    return found
+
+
+def timed_draw(people, excluded, fixed=None, seed=0):
+    start = time.perf_counter()
+    pairs = santa.draw_pairs(people, excluded, fixed=fixed, seed=seed)
+    return pairs, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--densities", type=int, nargs="+", default=[0, 2, 20, 200])
+    args = parser.parse_args()
+
+    rng = random.Random(2025)
+    failures = []
+    print(f"{'people':>7} {'excl/person':>12} {'exclusions':>11} {'draw ms':>9}")
+    for n in args.sizes:
+        people = list(range(1, n + 1))
+        for per_person in args.densities:
+            if per_person >= n - 2:
+                continue
+            excluded = make_exclusions(people, per_person, rng)
+            pairs, ms = timed_draw(people, excluded)
+            print(f"{n:>7} {per_person:>12} {len(excluded):>11} {ms:>9.1f}")
+            failures += [f"{n}/{per_person}: {p}" for p in problems(people, excluded, pairs)]
+
+    # Everyone may only give to the next two people around a circle
+    n = 1000
+    people = list(range(1, n + 1))
+    allowed = {(p, people[(i + k) % n]) for i, p in enumerate(people) for k in (1, 2)}
+    tight = {(g, r) for g in people for r in people if (g, r) not in allowed}
+    pairs, ms = timed_draw(people, tight)
+    print(f"tight: {n} people, 2 allowed receivers each, {ms:.1f} ms")
+    failures += [f"tight: {p}" for p in problems(people, tight, pairs)]
+
+    fixed = {1: 2, 3: 1}
+    pairs, _ = timed_draw(people[:100], set(), fixed=fixed)
+    failures += [f"fixed: {p}" for p in problems(people[:100], set(), pairs, fixed)]
+
+    try:
+        santa.draw_pairs([1, 2, 3], {(1, 2), (1, 3)})
+        failures.append("impossible draw did not raise")
+    except ValueError as e:
+        print(f"impossible: {e}")
+
+    with temp_database(copy_existing=False):
+        n = 1000
+        user_ids = seed(n, wishes_per_user=1, votes_per_user=0)
+        event_id = default_event_id()
+        session = db.get_session()
+        try:
+            # A tenth of the group already picked a gift in the market
+            wishes = dict(session.query(Wish.user_id, Wish.id).filter(Wish.event_id == event_id))
+            for giver, owner in zip(user_ids[:n // 10], user_ids[1:]):
+                claim_wish(session, event_id, wishes[owner], giver)
+            claims = claimed_pairs(session, event_id)
+            with count_statements() as counter:
+                start = time.perf_counter()
+                pairs, kept = draw_santa(session, event_id)
+                ms = (time.perf_counter() - start) * 1000
+            print(f"draw_santa: {n} members, {len(claims)} claims kept, {ms:.1f} ms, "
+                  f"{counter['statements']} SQL statements")
+            if santa_pairs(session, event_id) != pairs:
+                failures.append("draw_santa: saved pairs differ from the draw")
+            failures += [f"draw_santa: {p}" for p in problems(sorted(user_ids), set(), pairs, claims if kept else None)]
+        finally:
+            session.close()
+
+    if failures:
+        print("FAIL:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("OK: every draw is complete and breaks no rule")
+
+
+if __name__ == "__main__":
+    main()
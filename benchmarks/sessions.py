@@ -0,0 +1,92 @@
+"""Cost of restoring a login: password form vs. session token.
+
+Usage: python -m benchmarks.sessions [--repeat 200]
+
+Times, and counts the SQL statements of, the three ways a new tab gets a
+logged-in user: the login form (user lookup plus password KDF), a token
+this process has already validated (LRU hit) and a token seen for the
+first time (signature check plus one revocation lookup). Then checks that
+tampered, expired and revoked tokens are refused. Exits with status 1 on
+any failure.
+"""
+import argparse
+import sys
+import time
+
+import db
+import sessions
+from auth import verify_password_sync
+from db import User
+from benchmarks.common import temp_database, seed, count_statements
+
+
+def timed(func, repeat):
+    with count_statements() as counter:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = func()
+        elapsed = time.perf_counter() - start
+    return result, elapsed / repeat * 1000, counter["statements"] / repeat
+
+
+def password_login(username):
+    session = db.get_session()
+    try:
+        user = session.query(User).filter(User.username == username).first()
+        ok, _ = verify_password_sync("secret", user.password_hash)
+        return (user.id, user.username) if ok else None
+    finally:
+        session.close()
+
+
+def cold_validate(token):
+    sessions._forget(token)
+    return sessions.validate(token)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    failures = []
+    with temp_database(copy_existing=False):
+        user_id = seed(1, wishes_per_user=0, votes_per_user=0)[0]
+        username = f"user{user_id}"
+        token = sessions.issue(user_id, username)
+        expected = (user_id, username)
+
+        print(f"{'restore':<22} {'ms':>9} {'SQL':>5}")
+        for label, func, repeat in [
+            ("password form", lambda: password_login(username), max(args.repeat // 20, 1)),
+            ("token, cached", lambda: sessions.validate(token), args.repeat),
+            ("token, first seen", lambda: cold_validate(token), args.repeat),
+        ]:
+            result, ms, statements = timed(func, repeat)
+            print(f"{label:<22} {ms:>9.3f} {statements:>5.1f}")
+            if result != expected:
+                failures.append(f"{label} returned {result}, expected {expected}")
+
+        payload, _, signature = token.partition(".")
+        forged = sessions._b64encode(sessions._b64decode(payload).replace(b'"uid":', b'"uid":1')) + "." + signature
+        if sessions.validate(forged) is not None:
+            failures.append("a token with an edited payload was accepted")
+        if sessions.validate(sessions.issue(user_id, username, ttl=-1)) is not None:
+            failures.append("an expired token was accepted")
+        sessions.revoke(token)
+        if sessions.validate(token) is not None:
+            failures.append("a revoked token was accepted by the process that revoked it")
+        if cold_validate(token) is not None:
+            failures.append("a revoked token was accepted by a process that had not seen it")
+        other = sessions.issue(user_id, username)
+        if sessions.validate(other) != expected:
+            failures.append("revoking one token logged out the user's other sessions")
+
+    if failures:
+        print("FAIL:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("OK: tokens restore sessions; forged, expired and revoked ones are refused")
+
+
+if __name__ == "__main__":
+    main()
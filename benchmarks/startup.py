@@ -0,0 +1,96 @@
+"""Cold start: time to first render and resident memory of a fresh worker.
+
+Usage: python -m benchmarks.startup [--runs 5] [--out report.json] [--baseline old.json]
+
+Each run starts a new Python process that imports nothing up front, then
+renders app.py through AppTest: first the landing page (what every new
+visitor gets), then the profile page logged in. The child reports the
+time from its first line to each finished render, its peak RSS after each
+and whether pandas had been imported by then. Medians over the runs are
+printed. --out / --baseline work as in benchmarks.loadtest.
+
+The database is a temporary copy of reunion.db, shared by every run.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from benchmarks.common import APP_PATH, temp_database
+
+CHILD = r"""
+import time
+start = time.perf_counter()
+import json, resource, sys
+
+def mark(label):
+    report[label] = {
+        "ms": round((time.perf_counter() - start) * 1000, 1),
+        "rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "pandas": "pandas" in sys.modules,
+    }
+
+report = {}
+from streamlit.testing.v1 import AppTest
+from streamlit.navigation.page import calc_hash
+at = AppTest.from_file(%(app)r, default_timeout=120)
+at.run()
+assert not at.exception, at.exception
+mark("landing")
+at.session_state.logged_in = True
+at.session_state.user_id = 1
+at.session_state.username = "tengorio"
+at.run()
+at._page_hash = calc_hash("show_profile")
+at.run()
+assert not at.exception, at.exception
+mark("profile")
+print(json.dumps(report))
+"""
+
+
+def run_child():
+    out = subprocess.run([sys.executable, "-c", CHILD % {"app": APP_PATH}],
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    with temp_database():
+        run_child()  # warm the OS file cache and apply any migrations once
+        runs = [run_child() for _ in range(args.runs)]
+
+    report = {}
+    for stage in ("landing", "profile"):
+        report[stage] = {
+            "ms": round(statistics.median(r[stage]["ms"] for r in runs), 1),
+            "rss_mb": round(statistics.median(r[stage]["rss_mb"] for r in runs), 1),
+            "pandas": runs[-1][stage]["pandas"],
+        }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print(f"{'stage':<9} {'first render ms':>16} {'RSS MB':>8} {'pandas':>7}")
+    for stage, r in report.items():
+        line = f"{stage:<9} {r['ms']:>16.1f} {r['rss_mb']:>8.1f} {str(r['pandas']):>7}"
+        if baseline and stage in baseline:
+            b = baseline[stage]
+            line += f"   (before: {b['ms']:.1f} ms, {b['rss_mb']:.1f} MB)"
+        print(line)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Bytes sent per rerun with the stylesheet inlined vs. linked.
+
+Usage: python -m benchmarks.style_bytes
+
+Renders a few interactions through AppTest (the landing page, the login
+form, the logged-in profile and potluck pages) twice: with static serving
+forced off, where the CSS and the carousel keyframes are inlined in every
+rerun as before, and with the option as .streamlit/config.toml sets it (run
+from the repo root, like the app), where each rerun sends a <link> to the
+hashed stylesheet. Reports the encoded size of each rerun's elements and
+the size of the stylesheet file the browser downloads once. Exits with
+status 1 if the config leaves static serving off, since the app would then
+inline the CSS too, or if linking does not make every rerun smaller.
+"""
+import os
+import sys
+
+from streamlit import config
+
+import styles
+from benchmarks.common import APP_PATH, temp_database, seed
+from benchmarks.page_elements import walk
+
+
+def rerun_bytes():
+    from streamlit.navigation.page import calc_hash
+    from streamlit.testing.v1 import AppTest
+
+    sizes = {}
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    at.run()
+    sizes["landing"] = walk(at._tree)[1]
+    at.button[0].click().run()
+    sizes["login form"] = walk(at._tree)[1]
+
+    at.session_state.logged_in = True
+    at.session_state.user_id = 1
+    at.session_state.username = "amigo"
+    at.run()
+    for page in ("show_profile", "show_potluck"):
+        at._page_hash = calc_hash(page)
+        at.run()
+        assert not at.exception, at.exception
+        sizes[page] = walk(at._tree)[1]
+    return sizes
+
+
+def main():
+    configured = config.get_option("server.enableStaticServing")
+    if not configured:
+        print("FAIL: server.enableStaticServing is off in .streamlit/config.toml; the app inlines the CSS")
+        sys.exit(1)
+
+    results = {}
+    with temp_database(copy_existing=False):
+        seed(20)
+        for mode, static_serving in [("inline", False), ("linked", configured)]:
+            config.set_option("server.enableStaticServing", static_serving)
+            styles.stylesheet_url.clear()
+            results[mode] = rerun_bytes()
+        url = styles.stylesheet_url()
+
+    print(f"{'rerun':<14} {'inline B':>9} {'linked B':>9} {'saved':>7}")
+    failures = []
+    for name, inline in results["inline"].items():
+        linked = results["linked"][name]
+        print(f"{name:<14} {inline:>9} {linked:>9} {(inline - linked) / inline:>7.0%}")
+        if linked >= inline:
+            failures.append(name)
+    path = os.path.join(styles.STATIC_DIR, url[len(styles.STATIC_URL):])
+    print(f"stylesheet {url}: {os.path.getsize(path)} B, downloaded once")
+    if failures:
+        print(f"FAIL: linking did not shrink {', '.join(failures)}")
+        sys.exit(1)
+    print("OK: every rerun is smaller with the linked stylesheet")
+
+
+if __name__ == "__main__":
+    main()
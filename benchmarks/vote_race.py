@@ -0,0 +1,143 @@
+"""Double-click check for votes.
+
+Usage: python -m benchmarks.vote_race [--voters 50] [--potlucks 10] [--clicks 4]
+
+1. Builds a pre-migration database holding duplicate votes, runs the
+   migrations and checks that exactly the latest vote per (voter, potluck)
+   survives.
+2. Has every voter click each potluck's options several times at once
+   (one thread per click, all released by a barrier) and checks that each
+   voter ends up with exactly one vote per potluck, with one of the clicked
+   choices, and that vote_counts adds up.
+
+Exits with status 1 on any failure.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, insert
+
+import db
+from db import User, Potluck, Vote
+from migrations import baseline
+from queries import cast_vote, vote_counts
+from benchmarks.common import temp_database, default_event_id
+
+
+def check_dedupe_migration():
+    tmp = tempfile.mkdtemp()
+    url = f"sqlite:///{os.path.join(tmp, 'reunion.db')}"
+    try:
+        engine = create_engine(url)
+        baseline.create_all(engine)
+        tables = baseline.tables
+        with engine.begin() as conn:
+            conn.execute(insert(tables["users"]), [{"id": i, "username": f"u{i}", "password_hash": "x"} for i in (1, 2)])
+            conn.execute(insert(tables["potluck"]), [{"id": 1, "user_id": 1}, {"id": 2, "user_id": 2}])
+            conn.execute(insert(tables["votes"]), [
+                {"id": 1, "voter_id": 1, "potluck_id": 2, "dish_choice": 1},
+                {"id": 2, "voter_id": 1, "potluck_id": 2, "dish_choice": 3},
+                {"id": 3, "voter_id": 2, "potluck_id": 1, "dish_choice": 2},
+                {"id": 4, "voter_id": 1, "potluck_id": 2, "dish_choice": 2},
+                {"id": 5, "voter_id": 2, "potluck_id": 2, "dish_choice": 1},
+            ])
+        engine.dispose()
+
+        db.reset_engine(url)
+        db.init_db()
+        session = db.get_session()
+        rows = sorted(session.query(Vote.id, Vote.voter_id, Vote.potluck_id, Vote.dish_choice))
+        session.close()
+    finally:
+        db.reset_engine()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    expected = [(3, 2, 1, 2), (4, 1, 2, 2), (5, 2, 2, 1)]
+    if rows != expected:
+        return [f"dedupe migration left {rows}, expected {expected}"]
+    print("dedupe migration: kept the latest vote of each (voter, potluck)")
+    return []
+
+
+def check_double_clicks(args):
+    failures = []
+    with temp_database(copy_existing=False):
+        event_id = default_event_id()
+        session = db.get_session()
+        voter_ids = list(range(1, args.voters + 1))
+        session.execute(insert(User), [{"id": uid, "username": f"user{uid}", "password_hash": "x"} for uid in voter_ids])
+        session.execute(insert(Potluck), [{"event_id": event_id, "user_id": uid, "dish_1": "A", "dish_2": "B", "dish_3": "C"}
+                                          for uid in voter_ids[:args.potlucks]])
+        session.commit()
+        potluck_ids = [pid for (pid,) in session.query(Potluck.id)]
+        session.close()
+
+        rng = random.Random(0)
+        clicks = [(uid, pid, rng.randint(1, 3)) for uid in voter_ids for pid in potluck_ids for _ in range(args.clicks)]
+        clicked = {}
+        for uid, pid, choice in clicks:
+            clicked.setdefault((uid, pid), set()).add(choice)
+        barrier = threading.Barrier(len(clicks))
+        errors = []
+
+        def click(uid, pid, choice):
+            barrier.wait()
+            session = db.get_session()
+            try:
+                cast_vote(session, event_id, uid, pid, choice)
+            except Exception as e:
+                errors.append(repr(e))
+            finally:
+                session.close()
+
+        threads = [threading.Thread(target=click, args=c) for c in clicks]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        session = db.get_session()
+        rows = session.query(Vote.voter_id, Vote.potluck_id, Vote.dish_choice).all()
+        counts = vote_counts(session, event_id)
+        session.close()
+
+    print(f"double clicks: {len(clicks)} concurrent clicks in {elapsed:.2f}s, {len(rows)} votes stored")
+    failures.extend(errors[:5])
+    seen = {}
+    for uid, pid, choice in rows:
+        if (uid, pid) in seen:
+            failures.append(f"voter {uid} has more than one vote for potluck {pid}")
+        seen[(uid, pid)] = choice
+        if choice not in clicked.get((uid, pid), ()):
+            failures.append(f"voter {uid} potluck {pid} stored choice {choice} that was never clicked")
+    if set(seen) != set(clicked):
+        failures.append(f"{len(clicked)} voter/potluck pairs clicked but {len(seen)} stored")
+    if sum(counts.values()) != len(clicked):
+        failures.append(f"vote_counts adds up to {sum(counts.values())}, expected {len(clicked)}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--voters", type=int, default=50)
+    parser.add_argument("--potlucks", type=int, default=10)
+    parser.add_argument("--clicks", type=int, default=4, help="simultaneous clicks per voter and potluck")
+    args = parser.parse_args()
+
+    failures = check_dedupe_migration() + check_double_clicks(args)
+    if failures:
+        print("FAIL:\n  " + "\n  ".join(failures[:20]))
+        sys.exit(1)
+    print("OK: one vote per voter and potluck")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Writes per second with and without the write-behind queue.
+
+Usage: python -m benchmarks.write_queue [--threads 100] [--writes 20] [--flush-ms 10]
+
+Each thread is one user clicking through votes, date adds and date removals
+on a fresh SQLite file, first with one commit per write, then through the
+write queue, then through the queue again with every write made on a
+session that has just read (as a page rerun does), so the callers hold more
+pooled connections than the pool has while the writer needs one. Every
+user's sequence is the same in all runs, so the final votes and
+availability must match; exits with status 1 if they do not or if any write
+failed.
+"""
+import argparse
+import datetime
+import random
+import sys
+import threading
+import time
+
+import db
+from db import Availability, Potluck, Vote
+from queries import add_date, remove_date, cast_vote
+from writequeue import write_queue
+from benchmarks.common import temp_database, seed, default_event_id
+
+
+def plan(user_id, potluck_ids, writes):
+    rng = random.Random(user_id)
+    days = [datetime.date(2025, 12, 1) + datetime.timedelta(days=d) for d in range(31)]
+    steps = []
+    for _ in range(writes):
+        roll = rng.random()
+        if roll < 0.6:
+            steps.append(("vote", rng.choice(potluck_ids), rng.randint(1, 3)))
+        elif roll < 0.9:
+            steps.append(("add_date", rng.choice(days)))
+        else:
+            steps.append(("remove_date", rng.choice(days)))
+    return steps
+
+
+def run(args, queued, held_reads=False):
+    with temp_database(copy_existing=False):
+        event_id = default_event_id()
+        user_ids = seed(args.threads, wishes_per_user=0, votes_per_user=0)
+        session = db.get_session()
+        potluck_ids = [pid for (pid,) in session.query(Potluck.id)]
+        session.close()
+        plans = {uid: plan(uid, potluck_ids, args.writes) for uid in user_ids}
+
+        write_queue.reopen()
+        write_queue.flush_ms = args.flush_ms
+        write_queue.enabled = queued
+        barrier = threading.Barrier(len(user_ids))
+        errors = []
+
+        def worker(user_id):
+            barrier.wait()
+            for step in plans[user_id]:
+                session = db.get_session()
+                try:
+                    if held_reads:
+                        session.query(Potluck.id).first()
+                    if step[0] == "vote":
+                        cast_vote(session, event_id, user_id, step[1], step[2])
+                    elif step[0] == "add_date":
+                        add_date(session, event_id, user_id, step[1])
+                    else:
+                        remove_date(session, event_id, user_id, step[1])
+                except Exception as e:
+                    errors.append(repr(e))
+                finally:
+                    session.close()
+
+        threads = [threading.Thread(target=worker, args=(uid,)) for uid in user_ids]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        write_queue.close()
+        elapsed = time.perf_counter() - start
+        stats = write_queue.stats()
+        write_queue.enabled = False
+
+        session = db.get_session()
+        state = (
+            sorted(session.query(Vote.voter_id, Vote.potluck_id, Vote.dish_choice).all()),
+            sorted(session.query(Availability.user_id, Availability.date).all()),
+        )
+        session.close()
+
+    writes = len(user_ids) * args.writes
+    commits = stats["commits"] if queued else writes
+    label = f"queued ({args.flush_ms:g} ms)" if queued else "direct"
+    if held_reads:
+        label += ", reads"
+    print(f"{label:<23} {writes} writes in {elapsed:6.2f}s  {writes / elapsed:7.0f} writes/s  "
+          f"{commits} commits  {len(errors)} errors")
+    return state, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=100)
+    parser.add_argument("--writes", type=int, default=20, help="writes per thread")
+    parser.add_argument("--flush-ms", type=float, default=10)
+    args = parser.parse_args()
+
+    direct_state, direct_errors = run(args, queued=False)
+    queued_state, queued_errors = run(args, queued=True)
+    held_state, held_errors = run(args, queued=True, held_reads=True)
+
+    failures = (direct_errors + queued_errors + held_errors)[:5]
+    if not direct_state == queued_state == held_state:
+        failures.append("final votes/availability differ between direct and queued runs")
+    if failures:
+        print("FAIL:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("OK: same final state with and without the queue")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Build the landing background variants.
+
+Usage: python build_images.py
+
+Reads every JPEG in assets/, writes resized progressive JPEG and WebP
+variants to static/img/ with content-hashed filenames (so browsers and
+proxies can cache them forever), a blurred 24px placeholder inlined as a
+data URI, and static/img/manifest.json for images.carousel_css(). A wider
+variant that would not be smaller than its original is skipped, and its
+viewports get the next narrower one. Stale variants from earlier builds
+are removed. Also prints, and stores in the
+manifest, a report of the bytes a visitor downloads before and after, and
+exits with status 1 if the Streamlit config the app loads does not turn on
+static serving (without it the variants are never served).
+
+Needs Pillow (installed with Streamlit); the app itself only reads the
+manifest.
+"""
+import base64
+import glob
+import hashlib
+import io
+import json
+import os
+import sys
+
+from PIL import Image, ImageFilter
+
+from images import SOURCE_DIR, OUTPUT_DIR, MANIFEST_PATH, WIDTHS, ROOT
+
+JPEG_QUALITY = 72
+WEBP_QUALITY = 70
+PLACEHOLDER_WIDTH = 24
+
+
+def _encode(image, fmt, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+def _write(stem, width, ext, data):
+    digest = hashlib.sha256(data).hexdigest()[:10]
+    name = f"{stem}-{width}.{digest}.{ext}"
+    with open(os.path.join(OUTPUT_DIR, name), "wb") as f:
+        f.write(data)
+    return name
+
+
+def _placeholder(image):
+    height = max(1, round(image.height * PLACEHOLDER_WIDTH / image.width))
+    tiny = image.resize((PLACEHOLDER_WIDTH, height), Image.LANCZOS).filter(ImageFilter.GaussianBlur(1))
+    data = _encode(tiny, "JPEG", quality=40, optimize=True)
+    return "data:image/jpeg;base64," + base64.b64encode(data).decode("ascii")
+
+
+def build():
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    written = set()
+    images = []
+
+    for path in sorted(glob.glob(os.path.join(SOURCE_DIR, "*.jpg"))):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        source = Image.open(path).convert("RGB")
+        entry = {
+            "source": os.path.relpath(path, ROOT),
+            "source_bytes": os.path.getsize(path),
+            "placeholder": _placeholder(source),
+            "variants": {},
+        }
+        previous = None
+        for width in WIDTHS:
+            # Never upscale: small originals are re-encoded at their full size
+            actual = min(width, source.width)
+            height = round(source.height * actual / source.width)
+            resized = source.resize((actual, height), Image.LANCZOS) if actual != source.width else source
+            encoded = {
+                "jpg": _encode(resized, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True),
+                "webp": _encode(resized, "WEBP", quality=WEBP_QUALITY, method=6),
+            }
+            variant = {"width": actual}
+            for ext, data in encoded.items():
+                if previous is not None and len(data) >= entry["source_bytes"]:
+                    # No smaller than the original, so not worth a download:
+                    # these viewports get the next narrower variant instead
+                    variant[ext], variant[f"{ext}_bytes"] = previous[ext], previous[f"{ext}_bytes"]
+                    continue
+                variant[ext] = "img/" + _write(stem, actual, ext, data)
+                variant[f"{ext}_bytes"] = len(data)
+                written.add(os.path.basename(variant[ext]))
+            entry["variants"][str(width)] = previous = variant
+        images.append(entry)
+
+    for name in os.listdir(OUTPUT_DIR):
+        if name != os.path.basename(MANIFEST_PATH) and name not in written:
+            os.remove(os.path.join(OUTPUT_DIR, name))
+
+    manifest = {"images": images, "report": report(images)}
+    with open(MANIFEST_PATH, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    return manifest
+
+
+def report(images):
+    """Bytes downloaded for the whole carousel, per viewport class."""
+    before = sum(image["source_bytes"] for image in images)
+    rows = {"original": before}
+    for width in WIDTHS:
+        rows[f"{width}px webp"] = sum(image["variants"][str(width)]["webp_bytes"] for image in images)
+        rows[f"{width}px jpg"] = sum(image["variants"][str(width)]["jpg_bytes"] for image in images)
+    rows["inline placeholders"] = sum(len(image["placeholder"]) for image in images)
+    return rows
+
+
+def static_serving_on():
+    """Whether the config Streamlit loads for the app turns on static serving."""
+    # Streamlit reads .streamlit/config.toml from the directory it is started
+    # in, which for the app is the repo root
+    from streamlit import config
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    try:
+        config.get_config_options(force_reparse=True)
+        return bool(config.get_option("server.enableStaticServing"))
+    finally:
+        os.chdir(cwd)
+
+
+def main():
+    manifest = build()
+    rows = manifest["report"]
+    before = rows["original"]
+    print(f"{len(manifest['images'])} images -> {OUTPUT_DIR}")
+    for label, size in rows.items():
+        print(f"  {label:<20} {size / 1024:8.1f} KB  ({size / before:6.1%} of original)")
+    if not static_serving_on():
+        print("FAIL: server.enableStaticServing is off in .streamlit/config.toml; the variants will not be served")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
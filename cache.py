@@ -0,0 +1,128 @@
+"""Process-wide TTL cache for group aggregates.
+
+The group views (date counts, potluck table, vote counts, open wishes) are
+the same for every user, so they are computed once and shared between all
+sessions of the process. Every write helper in queries.py calls
+``invalidate()`` for the aggregates it touches: that bumps the key's version
+so the next reader reloads right away instead of waiting for the TTL.
+
+queries.py caches each aggregate per event, with (AVAILABILITY, event_id)
+style keys. Expired entries are swept out about once per TTL, so events
+that have gone quiet do not keep their data in memory.
+"""
+import os
+import threading
+import time
+
+AVAILABILITY = "availability"
+POTLUCKS = "potlucks"
+VOTES = "votes"
+WISHES = "wishes"
+# Built from the same rows as AVAILABILITY and dropped with it (queries.py)
+AVAILABILITY_MATRIX = "availability_matrix"
+
+DEFAULT_TTL = float(os.environ.get("AGGREGATE_CACHE_TTL", 30))
+
+
+class AggregateCache:
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self.enabled = ttl > 0
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._entries = {}   # key -> (version, expires_at, value)
+        self._versions = {}  # key -> version, bumped by invalidate()
+        self._hits = {}
+        self._misses = {}
+        self._listeners = []
+        self._next_sweep = 0.0
+
+    def get(self, key, loader, ttl=None):
+        """Return the cached value for key, calling loader() on a miss."""
+        if not self.enabled:
+            return loader()
+
+        value, version = self._lookup(key, count=True)
+        if version is None:
+            return value
+
+        # One loader per key at a time; the rest wait and reuse its result
+        with self._load_lock(key):
+            value, version = self._lookup(key, count=False)
+            if version is None:
+                return value
+            value = loader()
+            expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+            with self._lock:
+                # Skip storing if a write landed while we were loading
+                if self._versions.get(key, 0) == version:
+                    self._entries[key] = (version, expires_at, value)
+                self._sweep()
+        return value
+
+    def _lookup(self, key, count):
+        # Returns (value, None) on a hit, (None, current_version) on a miss
+        with self._lock:
+            version = self._versions.get(key, 0)
+            entry = self._entries.get(key)
+            if entry and entry[0] == version and entry[1] > time.monotonic():
+                if count:
+                    self._hits[key] = self._hits.get(key, 0) + 1
+                return entry[2], None
+            if count:
+                self._misses[key] = self._misses.get(key, 0) + 1
+            return None, version
+
+    def _sweep(self):
+        # Caller holds self._lock
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.ttl
+        for key in [k for k, entry in self._entries.items() if entry[1] <= now]:
+            del self._entries[key]
+
+    def _load_lock(self, key):
+        with self._lock:
+            return self._load_locks.setdefault(key, threading.Lock())
+
+    def subscribe(self, listener):
+        """Call listener(*keys) after every invalidate(); clear() passes no keys."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+                self._entries.pop(key, None)
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(*keys)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._versions) + list(self._entries):
+                self._versions[key] = self._versions.get(key, 0) + 1
+            self._entries.clear()
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener()
+
+    def stats(self):
+        """{key: {"hits": n, "misses": n, "hit_rate": 0..1}}"""
+        with self._lock:
+            keys = sorted(set(self._hits) | set(self._misses))
+            stats = {}
+            for key in keys:
+                hits, misses = self._hits.get(key, 0), self._misses.get(key, 0)
+                stats[key] = {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses)}
+            return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._hits.clear()
+            self._misses.clear()
+
+
+aggregates = AggregateCache()
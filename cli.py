@@ -0,0 +1,252 @@
+"""Bulk import/export for the reunion database.
+
+Usage:
+    python cli.py import users people.csv
+    python cli.py import wishes wishes.jsonl --batch-size 5000 --event primos-2026
+    python cli.py export votes votes.csv
+    python cli.py export users -            # JSON Lines to stdout
+    python cli.py counters [--rebuild]      # check the vote/date counters
+
+Tables: events, members, users, availability, potluck, wishes, votes. The
+file format comes from the extension (.csv or .jsonl); use --format for
+stdin/stdout. Columns are the model's columns (see db.py). Rows of the
+per-event tables without an event_id go to --event (a slug; default: the
+oldest event). For users, a plain
+``password`` column is hashed (in parallel) before insert; a
+``password_hash`` column is copied as-is, so exports load back unchanged.
+A user row with neither fails the import, listing the lines at fault.
+
+Imports stream the input in batches of executemany inserts inside a
+single transaction: either every row is loaded or none is. Rows with a
+plain password cost one KDF call each (see auth.py), so large user loads
+are bound by --hash-workers; everything else loads tens of thousands of
+rows per second. Exports stream rows from the database instead of loading
+whole tables. Imported votes and dates update the counter tables through
+their triggers (see counters.py); ``counters`` reports any drift and
+``--rebuild`` recomputes them from the source rows. Imports into the shared
+per-event tables bump the events' data versions in the same transaction
+(see versions.py), so pages already open in the app pick the rows up.
+"""
+import argparse
+import contextlib
+import csv
+import datetime
+import json
+import sys
+import time
+
+from sqlalchemy import Date, Integer, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import counters
+import db
+import versions
+from auth import hash_passwords
+from cache import AVAILABILITY, POTLUCKS, VOTES, WISHES
+from db import Event, EventMember, User, Availability, Potluck, Wish, Vote
+from queries import event_by_slug, default_event
+
+MODELS = {
+    "events": Event,
+    "members": EventMember,
+    "users": User,
+    "availability": Availability,
+    "potluck": Potluck,
+    "wishes": Wish,
+    "votes": Vote,
+}
+
+# Data version area (versions.py) each table's rows belong to
+AREAS = {"availability": AVAILABILITY, "potluck": POTLUCKS, "wishes": WISHES, "votes": VOTES}
+
+
+def _detect_format(path, fmt):
+    if fmt:
+        return fmt
+    if path.endswith(".csv"):
+        return "csv"
+    if path.endswith(".jsonl") or path.endswith(".ndjson"):
+        return "jsonl"
+    sys.exit(f"Cannot tell the format of {path!r}; pass --format csv|jsonl")
+
+
+def _converters(table):
+    def convert(column):
+        if isinstance(column.type, Integer):
+            return lambda value: None if value in (None, "") else int(value)
+        if isinstance(column.type, Date):
+            return lambda value: None if value in (None, "") else datetime.date.fromisoformat(value)
+        return lambda value: None if value is None else str(value)
+    return {column.name: convert(column) for column in table.columns}
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, row dict) for each row of the file."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for number, line in enumerate(stream, 1):
+            if line.strip():
+                yield number, json.loads(line)
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_rows(table_name, rows, batch_size=1000, hash_workers=None, event_id=None):
+    """Insert rows into table_name in one transaction. Returns the count.
+
+    rows are (line number, dict) pairs as read_rows() yields them. event_id
+    fills in the event of rows that do not name one. Raises ValueError,
+    writing nothing, if a user row has neither a password nor a hash.
+    """
+    model = MODELS[table_name]
+    table = model.__table__
+    converters = _converters(table)
+    count = 0
+    events = set()
+    no_password = []
+
+    with db.get_engine().begin() as conn:
+        for numbered in batches(rows, batch_size):
+            batch = [row for _, row in numbered]
+            if table_name == "users":
+                no_password += [line for line, row in numbered
+                                if not row.get("password_hash") and not row.get("password")]
+                if no_password:
+                    # The import fails anyway; keep reading only to list every bad line
+                    continue
+                plain = [i for i, row in enumerate(batch) if not row.get("password_hash")]
+                hashed = hash_passwords([batch[i]["password"] for i in plain], workers=hash_workers)
+                for i, password_hash in zip(plain, hashed):
+                    batch[i]["password_hash"] = password_hash
+            records = [
+                {name: converters[name](row[name]) for name in converters if name in row}
+                for row in batch
+            ]
+            if event_id is not None and "event_id" in converters:
+                for record in records:
+                    if record.get("event_id") is None:
+                        record["event_id"] = event_id
+            conn.execute(insert(table), records)
+            count += len(records)
+            if table_name in AREAS:
+                events.update(record.get("event_id") for record in records)
+        if no_password:
+            raise ValueError(f"{len(no_password)} users without password or password_hash, "
+                             f"on lines {', '.join(map(str, no_password))}")
+        if events:
+            versions.bump(Session(bind=conn), *[(AREAS[table_name], e) for e in events if e is not None])
+    return count
+
+
+def export_rows(table_name, batch_size=1000):
+    """Yield every row of table_name as a dict, streaming from the database."""
+    table = MODELS[table_name].__table__
+    with db.get_engine().connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(
+            select(table).order_by(*table.primary_key.columns)
+        )
+        for row in result.mappings():
+            yield {key: value.isoformat() if isinstance(value, datetime.date) else value
+                   for key, value in row.items()}
+
+
+def write_rows(stream, fmt, table_name, rows):
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(stream, fieldnames=[c.name for c in MODELS[table_name].__table__.columns])
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            stream.write(json.dumps(row, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def _event_id(slug):
+    session = db.get_session()
+    try:
+        event = event_by_slug(session, slug) if slug else default_event(session)
+    finally:
+        session.close()
+    if event is None:
+        sys.exit(f"No event {slug!r}" if slug else "No events in the database")
+    return event[0]
+
+
+def check_counters(rebuild=False):
+    db.init_db()
+    with db.get_engine().begin() as conn:
+        drift = counters.check(conn)
+        for line in drift:
+            print(line)
+        if rebuild:
+            counters.rebuild(conn)
+    if not drift:
+        print("Counters match the source rows", file=sys.stderr)
+    elif rebuild:
+        print(f"Rebuilt the counters ({len(drift)} were off)", file=sys.stderr)
+    else:
+        sys.exit(f"{len(drift)} counters are off; run with --rebuild to fix them")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import/export for the reunion database.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("import", "export"):
+        cmd = sub.add_parser(name)
+        cmd.add_argument("table", choices=sorted(MODELS))
+        cmd.add_argument("path", help="file to read/write, or - for stdin/stdout")
+        cmd.add_argument("--format", choices=["csv", "jsonl"])
+        cmd.add_argument("--batch-size", type=int, default=1000)
+    sub.choices["import"].add_argument("--hash-workers", type=int,
+                                       help="threads for password hashing (default: the shared pool)")
+    sub.choices["import"].add_argument("--event", help="slug of the event for rows without an event_id")
+    cmd = sub.add_parser("counters", help="check the vote and attendee counters against the source rows")
+    cmd.add_argument("--rebuild", action="store_true", help="recompute the counters from the source rows")
+    args = parser.parse_args(argv)
+
+    if args.command == "counters":
+        return check_counters(args.rebuild)
+
+    fmt = _detect_format(args.path, args.format) if args.path != "-" else (args.format or "jsonl")
+    db.init_db()
+    start = time.perf_counter()
+
+    if args.command == "import":
+        stream = contextlib.nullcontext(sys.stdin) if args.path == "-" else open(args.path, newline="", encoding="utf-8")
+        with stream as f:
+            try:
+                count = import_rows(args.table, read_rows(f, fmt), args.batch_size, args.hash_workers,
+                                    _event_id(args.event))
+            except IntegrityError as e:
+                sys.exit(f"Import failed, nothing was written: {e.orig}")
+            except ValueError as e:
+                sys.exit(f"Import failed, nothing was written: {e}")
+        verb = "Imported"
+    else:
+        stream = contextlib.nullcontext(sys.stdout) if args.path == "-" else open(args.path, "w", newline="", encoding="utf-8")
+        with stream as f:
+            count = write_rows(f, fmt, args.table, export_rows(args.table, args.batch_size))
+        verb = "Exported"
+
+    print(f"{verb} {count} {args.table} rows in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
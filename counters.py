@@ -0,0 +1,227 @@
+"""Denormalized vote and attendee counters.
+
+``vote_totals`` holds the number of votes per (event, potluck, dish choice)
+and ``date_totals`` the number of attendees per (event, date). Database triggers on
+``votes`` and ``availability_dates`` keep them current inside the same
+transaction as the change, so every writer (the app, the write queue, the
+CLI import, a manual SQL fix) updates them and the group views read one
+small row per displayed item instead of scanning every vote.
+
+Rows whose count drops to zero are deleted. ``check()`` recomputes the
+counts from the source rows and lists any drift; ``rebuild()`` rewrites
+both tables from scratch. Both are exposed as ``python cli.py counters``.
+"""
+from sqlalchemy import text
+
+# SQL below is written as templates: {ev} and friends expand to the event_id
+# column for the current, per-event schema (scoped=True) and to nothing for
+# the single-event schema that migration 5 installed (scoped=False).
+_SCOPED = {"ev": "event_id, ", "new_ev": "NEW.event_id, ", "old_ev": "event_id = OLD.event_id AND "}
+_UNSCOPED = {"ev": "", "new_ev": "", "old_ev": ""}
+
+VOTE_COUNTS_SQL = """
+    SELECT {ev}potluck_id, dish_choice, COUNT(*) FROM votes
+    WHERE potluck_id IS NOT NULL AND dish_choice IS NOT NULL
+    GROUP BY {ev}potluck_id, dish_choice
+"""
+DATE_COUNTS_SQL = "SELECT {ev}date, COUNT(*) FROM availability_dates GROUP BY {ev}date"
+
+_SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS votes_counter_insert AFTER INSERT ON votes
+    BEGIN
+        INSERT INTO vote_totals ({ev}potluck_id, dish_choice, total)
+        SELECT {new_ev}NEW.potluck_id, NEW.dish_choice, 1
+        WHERE NEW.potluck_id IS NOT NULL AND NEW.dish_choice IS NOT NULL
+        ON CONFLICT ({ev}potluck_id, dish_choice) DO UPDATE SET total = total + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS votes_counter_delete AFTER DELETE ON votes
+    BEGIN
+        UPDATE vote_totals SET total = total - 1
+        WHERE {old_ev}potluck_id = OLD.potluck_id AND dish_choice = OLD.dish_choice;
+        DELETE FROM vote_totals
+        WHERE {old_ev}potluck_id = OLD.potluck_id AND dish_choice = OLD.dish_choice AND total <= 0;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS votes_counter_update AFTER UPDATE OF potluck_id, dish_choice ON votes
+    BEGIN
+        UPDATE vote_totals SET total = total - 1
+        WHERE {old_ev}potluck_id = OLD.potluck_id AND dish_choice = OLD.dish_choice;
+        DELETE FROM vote_totals
+        WHERE {old_ev}potluck_id = OLD.potluck_id AND dish_choice = OLD.dish_choice AND total <= 0;
+        INSERT INTO vote_totals ({ev}potluck_id, dish_choice, total)
+        SELECT {new_ev}NEW.potluck_id, NEW.dish_choice, 1
+        WHERE NEW.potluck_id IS NOT NULL AND NEW.dish_choice IS NOT NULL
+        ON CONFLICT ({ev}potluck_id, dish_choice) DO UPDATE SET total = total + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS availability_counter_insert AFTER INSERT ON availability_dates
+    BEGIN
+        INSERT INTO date_totals ({ev}date, attendees) VALUES ({new_ev}NEW.date, 1)
+        ON CONFLICT ({ev}date) DO UPDATE SET attendees = attendees + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS availability_counter_delete AFTER DELETE ON availability_dates
+    BEGIN
+        UPDATE date_totals SET attendees = attendees - 1 WHERE {old_ev}date = OLD.date;
+        DELETE FROM date_totals WHERE {old_ev}date = OLD.date AND attendees <= 0;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS availability_counter_update AFTER UPDATE OF date ON availability_dates
+    BEGIN
+        UPDATE date_totals SET attendees = attendees - 1 WHERE {old_ev}date = OLD.date;
+        DELETE FROM date_totals WHERE {old_ev}date = OLD.date AND attendees <= 0;
+        INSERT INTO date_totals ({ev}date, attendees) VALUES ({new_ev}NEW.date, 1)
+        ON CONFLICT ({ev}date) DO UPDATE SET attendees = attendees + 1;
+    END
+    """,
+]
+
+_POSTGRES_TRIGGERS = [
+    """
+    CREATE OR REPLACE FUNCTION votes_counter() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE vote_totals SET total = total - 1
+            WHERE {old_ev}potluck_id = OLD.potluck_id AND dish_choice = OLD.dish_choice;
+            DELETE FROM vote_totals
+            WHERE {old_ev}potluck_id = OLD.potluck_id AND dish_choice = OLD.dish_choice AND total <= 0;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.potluck_id IS NOT NULL AND NEW.dish_choice IS NOT NULL THEN
+            INSERT INTO vote_totals ({ev}potluck_id, dish_choice, total) VALUES ({new_ev}NEW.potluck_id, NEW.dish_choice, 1)
+            ON CONFLICT ({ev}potluck_id, dish_choice) DO UPDATE SET total = vote_totals.total + 1;
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER votes_counter AFTER INSERT OR DELETE OR UPDATE OF potluck_id, dish_choice ON votes
+    FOR EACH ROW EXECUTE FUNCTION votes_counter()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION availability_counter() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE date_totals SET attendees = attendees - 1 WHERE {old_ev}date = OLD.date;
+            DELETE FROM date_totals WHERE {old_ev}date = OLD.date AND attendees <= 0;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO date_totals ({ev}date, attendees) VALUES ({new_ev}NEW.date, 1)
+            ON CONFLICT ({ev}date) DO UPDATE SET attendees = date_totals.attendees + 1;
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER availability_counter AFTER INSERT OR DELETE OR UPDATE OF date ON availability_dates
+    FOR EACH ROW EXECUTE FUNCTION availability_counter()
+    """,
+]
+
+_MYSQL_VOTE_DECREMENT = """
+        UPDATE vote_totals SET total = total - 1
+        WHERE {old_ev}potluck_id = OLD.potluck_id AND dish_choice = OLD.dish_choice;
+        DELETE FROM vote_totals
+        WHERE {old_ev}potluck_id = OLD.potluck_id AND dish_choice = OLD.dish_choice AND total <= 0;"""
+_MYSQL_VOTE_INCREMENT = """
+        IF NEW.potluck_id IS NOT NULL AND NEW.dish_choice IS NOT NULL THEN
+            INSERT INTO vote_totals ({ev}potluck_id, dish_choice, total) VALUES ({new_ev}NEW.potluck_id, NEW.dish_choice, 1)
+            ON DUPLICATE KEY UPDATE total = total + 1;
+        END IF;"""
+_MYSQL_DATE_DECREMENT = """
+        UPDATE date_totals SET attendees = attendees - 1 WHERE {old_ev}date = OLD.date;
+        DELETE FROM date_totals WHERE {old_ev}date = OLD.date AND attendees <= 0;"""
+_MYSQL_DATE_INCREMENT = """
+        INSERT INTO date_totals ({ev}date, attendees) VALUES ({new_ev}NEW.date, 1)
+        ON DUPLICATE KEY UPDATE attendees = attendees + 1;"""
+
+_MYSQL_TRIGGERS = [
+    f"CREATE TRIGGER votes_counter_insert AFTER INSERT ON votes FOR EACH ROW BEGIN{_MYSQL_VOTE_INCREMENT}\n    END",
+    f"CREATE TRIGGER votes_counter_delete AFTER DELETE ON votes FOR EACH ROW BEGIN{_MYSQL_VOTE_DECREMENT}\n    END",
+    f"CREATE TRIGGER votes_counter_update AFTER UPDATE ON votes FOR EACH ROW BEGIN{_MYSQL_VOTE_DECREMENT}{_MYSQL_VOTE_INCREMENT}\n    END",
+    f"CREATE TRIGGER availability_counter_insert AFTER INSERT ON availability_dates FOR EACH ROW BEGIN{_MYSQL_DATE_INCREMENT}\n    END",
+    f"CREATE TRIGGER availability_counter_delete AFTER DELETE ON availability_dates FOR EACH ROW BEGIN{_MYSQL_DATE_DECREMENT}\n    END",
+    f"CREATE TRIGGER availability_counter_update AFTER UPDATE ON availability_dates FOR EACH ROW BEGIN{_MYSQL_DATE_DECREMENT}{_MYSQL_DATE_INCREMENT}\n    END",
+]
+
+_TRIGGER_NAMES = ["votes_counter_insert", "votes_counter_delete", "votes_counter_update",
+                  "availability_counter_insert", "availability_counter_delete", "availability_counter_update"]
+
+# {dialect: (create statements, drop statements)}
+TRIGGERS = {
+    "sqlite": (_SQLITE_TRIGGERS, [f"DROP TRIGGER IF EXISTS {name}" for name in _TRIGGER_NAMES]),
+    "postgresql": (_POSTGRES_TRIGGERS, [
+        "DROP TRIGGER IF EXISTS votes_counter ON votes",
+        "DROP TRIGGER IF EXISTS availability_counter ON availability_dates",
+        "DROP FUNCTION IF EXISTS votes_counter()",
+        "DROP FUNCTION IF EXISTS availability_counter()",
+    ]),
+    "mysql": (_MYSQL_TRIGGERS, [f"DROP TRIGGER IF EXISTS {name}" for name in _TRIGGER_NAMES]),
+}
+TRIGGERS["mariadb"] = TRIGGERS["mysql"]
+
+
+def _sql(template, scoped=True):
+    return template.format(**(_SCOPED if scoped else _UNSCOPED))
+
+
+def _dialect(conn):
+    name = conn.dialect.name
+    if name not in TRIGGERS:
+        raise RuntimeError(f"No counter triggers for the {name} dialect")
+    return name
+
+
+def install_triggers(conn, scoped=True):
+    """(Re)create the counter triggers on conn's database."""
+    create, drop = TRIGGERS[_dialect(conn)]
+    for statement in drop + create:
+        conn.exec_driver_sql(_sql(statement, scoped))
+
+
+def drop_triggers(conn):
+    for statement in TRIGGERS[_dialect(conn)][1]:
+        conn.exec_driver_sql(statement)
+
+
+def _key(row):
+    # (event_id, ..., count) -> (event_id, ...); SQLite hands dates back as
+    # text from raw SQL, so other dialects' dates are compared as text too
+    return tuple(v.isoformat() if hasattr(v, "isoformat") else v for v in row[:-1])
+
+
+def expected_counts(conn):
+    """({(event_id, potluck_id, dish_choice): votes}, {(event_id, date): attendees}) from the source rows."""
+    votes = {_key(row): row[-1] for row in conn.execute(text(_sql(VOTE_COUNTS_SQL)))}
+    dates = {_key(row): row[-1] for row in conn.execute(text(_sql(DATE_COUNTS_SQL)))}
+    return votes, dates
+
+
+def stored_counts(conn):
+    votes = {_key(row): row[-1] for row in conn.execute(text("SELECT event_id, potluck_id, dish_choice, total FROM vote_totals"))}
+    dates = {_key(row): row[-1] for row in conn.execute(text("SELECT event_id, date, attendees FROM date_totals"))}
+    return votes, dates
+
+
+def check(conn):
+    """List the counters that differ from the source rows (empty if none)."""
+    drift = []
+    for label, expected, stored in zip(("vote", "date"), expected_counts(conn), stored_counts(conn)):
+        for key in sorted(set(expected) | set(stored), key=str):
+            if expected.get(key, 0) != stored.get(key, 0):
+                drift.append(f"{label} {key}: stored {stored.get(key, 0)}, actual {expected.get(key, 0)}")
+    return drift
+
+
+def rebuild(conn, scoped=True):
+    """Rewrite both counter tables from the source rows."""
+    conn.execute(text("DELETE FROM vote_totals"))
+    conn.execute(text("DELETE FROM date_totals"))
+    conn.execute(text(_sql(f"INSERT INTO vote_totals ({{ev}}potluck_id, dish_choice, total) {VOTE_COUNTS_SQL}", scoped)))
+    conn.execute(text(_sql(f"INSERT INTO date_totals ({{ev}}date, attendees) {DATE_COUNTS_SQL}", scoped)))
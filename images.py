@@ -0,0 +1,78 @@
+"""Landing background images.
+
+``build_images.py`` turns the photos in assets/ into resized, progressive
+JPEG and WebP variants with content-hashed names under static/img/, plus a
+tiny blurred placeholder for each photo, and records them in
+static/img/manifest.json. ``carousel_css()`` reads that manifest and
+returns the CSS for the landing carousel: each viewport width gets the
+smallest variant that covers it, WebP where the browser supports it, with
+the placeholder painted underneath until the real image arrives.
+"""
+import json
+import os
+
+import streamlit as st
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.join(ROOT, "assets")
+STATIC_DIR = os.path.join(ROOT, "static")
+OUTPUT_DIR = os.path.join(STATIC_DIR, "img")
+MANIFEST_PATH = os.path.join(OUTPUT_DIR, "manifest.json")
+
+# Variant widths; each covers viewports up to that many CSS pixels
+WIDTHS = [480, 960, 1600]
+
+# Where Streamlit serves ./static when server.enableStaticServing is on
+STATIC_URL = "app/static/"
+
+
+@st.cache_resource
+def load_manifest():
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _background(index, image, width, static_serving):
+    # Placeholders are defined once as custom properties (see carousel_css)
+    placeholder = f"var(--bg-placeholder-{index})"
+    if not static_serving:
+        return f"background-image: {placeholder};"
+    variant = image["variants"][str(width)]
+    jpg = f"url('{STATIC_URL}{variant['jpg']}')"
+    webp = f"url('{STATIC_URL}{variant['webp']}')"
+    return (
+        f"background-image: {jpg}, {placeholder}; "
+        f"background-image: image-set({webp} type('image/webp'), {jpg} type('image/jpeg')), {placeholder};"
+    )
+
+
+def _keyframes(images, width, static_serving):
+    steps = [i * 100 // len(images) for i in range(len(images))] + [100]
+    frames = list(enumerate(images)) + [(0, images[0])]
+    body = "\n".join(
+        f"        {step}% {{ {_background(index, image, width, static_serving)} }}"
+        for step, (index, image) in zip(steps, frames)
+    )
+    return f"    @keyframes bgCarousel {{\n{body}\n    }}"
+
+
+def carousel_css():
+    """CSS for the .landing-bg carousel, or "" if the images were never built."""
+    manifest = load_manifest()
+    if not manifest or not manifest["images"]:
+        return ""
+    images = manifest["images"]
+    # Without static serving only the inline placeholders can be shown
+    static_serving = st.get_option("server.enableStaticServing")
+
+    placeholders = " ".join(
+        f"--bg-placeholder-{index}: url('{image['placeholder']}');" for index, image in enumerate(images)
+    )
+    css = [f"    .landing-bg {{ {placeholders} }}", _keyframes(images, WIDTHS[0], static_serving)]
+    if static_serving:
+        for smaller, width in zip(WIDTHS, WIDTHS[1:]):
+            css.append(f"    @media (min-width: {smaller + 1}px) {{\n{_keyframes(images, width, True)}\n    }}")
+    return "\n".join(css)
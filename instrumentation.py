@@ -0,0 +1,168 @@
+"""Per-rerun timing and SQL instrumentation.
+
+Wrap a page function with ``traced`` and, while instrumentation is on,
+every call records a span: wall time, CPU time of the rerun's thread, time
+spent inside SQL statements, the rest as Python time, the number of
+statements and the rows fetched through the ORM session. Fragments (see
+app.py) are traced too and show up under their own name; their work,
+time and SQL alike, is not counted again in the page that contains them.
+Spans are kept in a small in-memory ring for the admin sidebar panel and,
+if TRACE_FILE is set, appended to that file as JSON Lines so a real
+evening can be analysed afterwards.
+
+When instrumentation is off ``traced`` calls straight through and the SQL
+hooks are never installed, so the cost is one flag check per rerun.
+Turn it on with INSTRUMENTATION=1 or from the admin panel.
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+TRACE_FILE = os.environ.get("TRACE_FILE")
+RECENT_SPANS = 200
+
+enabled = os.environ.get("INSTRUMENTATION", "") not in ("", "0", "false")
+recent = deque(maxlen=RECENT_SPANS)
+
+_current = contextvars.ContextVar("reunion_span", default=None)
+_install_lock = threading.Lock()
+_installed = False
+_file_lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ("name", "started_at", "wall", "cpu", "db_time", "statements", "rows", "nested_wall", "nested_cpu")
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = time.time()
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.db_time = 0.0
+        self.statements = 0
+        self.rows = 0
+        # Wall and CPU time of traced calls made inside this one (fragments
+        # in a page), taken out of this span's own times
+        self.nested_wall = 0.0
+        self.nested_cpu = 0.0
+
+    def as_dict(self):
+        return {
+            "ts": round(self.started_at, 3),
+            "page": self.name,
+            "wall_ms": round(self.wall * 1000, 2),
+            "cpu_ms": round(self.cpu * 1000, 2),
+            "db_ms": round(self.db_time * 1000, 2),
+            "python_ms": round(max(self.wall - self.db_time, 0) * 1000, 2),
+            "statements": self.statements,
+            "rows": self.rows,
+        }
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("reunion_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = _current.get()
+    if span is None:
+        return
+    starts = conn.info.get("reunion_query_start")
+    if starts:
+        span.db_time += time.perf_counter() - starts.pop()
+    span.statements += 1
+
+
+def _do_orm_execute(orm_execute_state):
+    span = _current.get()
+    if span is None or not orm_execute_state.is_select:
+        return None
+    # Materialize the result to count its rows, then hand back an
+    # equivalent result object to the caller
+    frozen = orm_execute_state.invoke_statement().freeze()
+    span.rows += len(frozen.data)
+    return frozen()
+
+
+def install():
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Session, "do_orm_execute", _do_orm_execute)
+        _installed = True
+
+
+def set_enabled(value):
+    global enabled
+    if value:
+        install()
+    enabled = value
+
+
+def _record(span):
+    recent.append(span)
+    if TRACE_FILE:
+        line = json.dumps(span.as_dict()) + "\n"
+        with _file_lock:
+            with open(TRACE_FILE, "a") as f:
+                f.write(line)
+
+
+def traced(func):
+    """Decorator recording a span for each call while instrumentation is on."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return func(*args, **kwargs)
+        install()
+        parent = _current.get()
+        span = Span(func.__name__)
+        token = _current.set(span)
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            wall = time.perf_counter() - start
+            cpu = time.thread_time() - cpu_start
+            span.wall = wall - span.nested_wall
+            span.cpu = cpu - span.nested_cpu
+            _current.reset(token)
+            if parent is not None:
+                parent.nested_wall += wall
+                parent.nested_cpu += cpu
+            _record(span)
+    return wrapper
+
+
+def summary():
+    """Per-page aggregates over the recent spans, slowest first."""
+    pages = {}
+    for span in list(recent):
+        pages.setdefault(span.name, []).append(span)
+    rows = []
+    for name, spans in pages.items():
+        walls = sorted(s.wall for s in spans)
+        rows.append({
+            "Página": name,
+            "Reruns": len(spans),
+            "ms p50": round(walls[len(walls) // 2] * 1000, 1),
+            "ms máx": round(walls[-1] * 1000, 1),
+            "ms CPU/rerun": round(sum(s.cpu for s in spans) * 1000 / len(spans), 1),
+            "SQL/rerun": round(sum(s.statements for s in spans) / len(spans), 1),
+            "ms BD/rerun": round(sum(s.db_time for s in spans) * 1000 / len(spans), 1),
+            "Filas/rerun": round(sum(s.rows for s in spans) / len(spans), 1),
+        })
+    return sorted(rows, key=lambda row: row["ms p50"], reverse=True)
@@ -0,0 +1,364 @@
+"""Versioned schema migrations.
+
+The schema version lives in the single-row ``schema_version`` table. On
+startup ``upgrade()`` takes a database-wide lock, reads the version and runs
+only the steps that are missing, so several workers starting at once apply
+each step exactly once.
+
+A brand-new database is created straight from the models (plus the counter
+triggers, see counters.py) and stamped with the latest version. A database from before versioning (tables present, no
+``schema_version``) counts as version 0 and goes through every step.
+
+To change the schema: update the models in db.py, then append a step to
+MIGRATIONS that brings an existing database to the same shape.
+"""
+import datetime
+import json
+import sys
+
+from sqlalchemy import MetaData, Table, Column, Integer, String, Text, Date, ForeignKey, Index, UniqueConstraint, func, inspect, select, text
+
+import counters
+from db import Base, Event, DEFAULT_EVENT_SLUG, DEFAULT_EVENT_NAME
+
+# Lock key for pg_advisory_xact_lock / GET_LOCK
+LOCK_NAME = "reunion_schema_migrations"
+LOCK_KEY = 72010
+
+meta = MetaData()
+
+version_table = Table(
+    "schema_version", meta,
+    Column("version", Integer, nullable=False),
+)
+
+# Frozen copy of the tables as they were before migrations existed. Steps
+# must not use the live models, which describe the latest schema.
+baseline = MetaData()
+Table(
+    "users", baseline,
+    Column("id", Integer, primary_key=True),
+    Column("username", String(50), unique=True, nullable=False),
+    Column("password_hash", String(128), nullable=False),
+    Column("name", String(100)),
+)
+Table(
+    "availability", baseline,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("dates_json", Text),
+)
+Table(
+    "potluck", baseline,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("dish_1", String(200)),
+    Column("dish_2", String(200)),
+    Column("dish_3", String(200)),
+    Column("assigned_dish", String(200)),
+)
+Table(
+    "wishes", baseline,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("description", String(255)),
+    Column("claimed_by_id", Integer, ForeignKey("users.id"), nullable=True),
+)
+Table(
+    "votes", baseline,
+    Column("id", Integer, primary_key=True),
+    Column("voter_id", Integer, ForeignKey("users.id")),
+    Column("potluck_id", Integer, ForeignKey("potluck.id")),
+    Column("dish_choice", Integer),
+)
+
+
+def _baseline(conn):
+    # Older databases can be missing tables added later on (e.g. votes)
+    baseline.create_all(conn, checkfirst=True)
+
+
+def _availability_dates(conn):
+    # Split the per-user JSON lists into one row per (user, date). The old
+    # availability table is left in place, untouched, as a backup.
+    table = Table(
+        "availability_dates", MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("user_id", Integer, ForeignKey(baseline.tables["users"].c.id), nullable=False),
+        Column("date", Date, nullable=False),
+        UniqueConstraint("user_id", "date", name="uq_availability_user_date"),
+        Index("ix_availability_date", "date"),
+    )
+    table.create(conn, checkfirst=True)
+
+    legacy = baseline.tables["availability"]
+    rows = set()
+    for user_id, dates_json in conn.execute(select(legacy.c.user_id, legacy.c.dates_json)):
+        if user_id is None or not dates_json:
+            continue
+        try:
+            dates = json.loads(dates_json)
+        except ValueError:
+            continue
+        for d in dates:
+            try:
+                rows.add((user_id, datetime.date.fromisoformat(d)))
+            except (TypeError, ValueError):
+                pass
+    if rows:
+        conn.execute(table.insert(), [{"user_id": u, "date": d} for u, d in sorted(rows)])
+
+
+def _wishes_claim_index(conn):
+    Index(
+        "ix_wishes_claimed_by_user",
+        baseline.tables["wishes"].c.claimed_by_id,
+        baseline.tables["wishes"].c.user_id,
+    ).create(conn, checkfirst=True)
+
+
+def _unique_votes(conn):
+    # Keep each voter's latest vote per potluck, then enforce it
+    votes = baseline.tables["votes"]
+    # The derived table keeps MySQL from rejecting a subquery on the target
+    keep = select(func.max(votes.c.id).label("id")).group_by(votes.c.voter_id, votes.c.potluck_id).subquery("keep")
+    removed = conn.execute(votes.delete().where(votes.c.id.not_in(select(keep.c.id)))).rowcount
+    if removed:
+        print(f"  removed {removed} duplicate votes", file=sys.stderr)
+    Index("uq_votes_voter_potluck", votes.c.voter_id, votes.c.potluck_id, unique=True).create(conn, checkfirst=True)
+    Index("ix_votes_potluck_dish", votes.c.potluck_id, votes.c.dish_choice).create(conn, checkfirst=True)
+
+
+def _counters(conn):
+    Table(
+        "vote_totals", MetaData(),
+        Column("potluck_id", Integer, primary_key=True),
+        Column("dish_choice", Integer, primary_key=True),
+        Column("total", Integer, nullable=False),
+    ).create(conn, checkfirst=True)
+    Table(
+        "date_totals", MetaData(),
+        Column("date", Date, primary_key=True),
+        Column("attendees", Integer, nullable=False),
+    ).create(conn, checkfirst=True)
+    # Single-event shape; migration 6 reinstalls them per event
+    counters.install_triggers(conn, scoped=False)
+    counters.rebuild(conn, scoped=False)
+
+
+def _default_event(conn, events):
+    return conn.execute(events.insert().values(slug=DEFAULT_EVENT_SLUG, name=DEFAULT_EVENT_NAME)).inserted_primary_key[0]
+
+
+def _events(conn):
+    # Everything that exists so far belongs to the default event
+    counters.drop_triggers(conn)
+    event_meta = MetaData()
+    events = Table(
+        "events", event_meta,
+        Column("id", Integer, primary_key=True),
+        Column("slug", String(50), unique=True, nullable=False),
+        Column("name", String(100), nullable=False),
+    )
+    members = Table(
+        "event_members", event_meta,
+        Column("event_id", Integer, ForeignKey(events.c.id), primary_key=True),
+        Column("user_id", Integer, ForeignKey(baseline.tables["users"].c.id), primary_key=True),
+        Index("ix_event_members_user", "user_id"),
+    )
+    event_meta.create_all(conn)
+    event_id = int(_default_event(conn, events))
+    conn.exec_driver_sql(f"INSERT INTO event_members (event_id, user_id) SELECT {event_id}, id FROM users")
+
+    # A plain column (no REFERENCES), which every backend can add in place
+    for table in ("potluck", "wishes", "votes"):
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN event_id INTEGER NOT NULL DEFAULT {event_id}")
+
+    # SQLite cannot drop the (user_id, date) constraint, so the table is
+    # rebuilt with the event-scoped one
+    dates = Table(
+        "availability_dates_new", MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("event_id", Integer, ForeignKey(events.c.id), nullable=False),
+        Column("user_id", Integer, ForeignKey(baseline.tables["users"].c.id), nullable=False),
+        Column("date", Date, nullable=False),
+        UniqueConstraint("event_id", "user_id", "date", name="uq_availability_event_user_date"),
+    )
+    dates.create(conn)
+    conn.exec_driver_sql(
+        "INSERT INTO availability_dates_new (id, event_id, user_id, date) "
+        f"SELECT id, {event_id}, user_id, date FROM availability_dates"
+    )
+    conn.exec_driver_sql("DROP TABLE availability_dates")
+    conn.exec_driver_sql("ALTER TABLE availability_dates_new RENAME TO availability_dates")
+    if conn.dialect.name == "postgresql":
+        # The ids were copied explicitly, which leaves the new SERIAL
+        # sequence at 1; move it past them so new rows do not collide
+        conn.exec_driver_sql(
+            "SELECT setval(pg_get_serial_sequence('availability_dates', 'id'), "
+            "COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) FROM availability_dates"
+        )
+
+    scoped = MetaData()
+    scoped_tables = {
+        name: Table(name, scoped, *[Column(c, Integer) for c in columns])
+        for name, columns in {
+            "availability_dates": ["event_id", "date"],
+            "potluck": ["event_id", "user_id"],
+            "wishes": ["event_id", "claimed_by_id", "user_id"],
+            "votes": ["event_id", "voter_id", "potluck_id", "dish_choice"],
+        }.items()
+    }
+    old_indexes = [
+        ("ix_wishes_claimed_by_user", "wishes"),
+        ("uq_votes_voter_potluck", "votes"),
+        ("ix_votes_potluck_dish", "votes"),
+    ]
+    for name, table in old_indexes:
+        Index(name, scoped_tables[table].c.event_id).drop(conn, checkfirst=True)
+    c = {name: table.c for name, table in scoped_tables.items()}
+    for index in [
+        Index("ix_availability_event_date", c["availability_dates"].event_id, c["availability_dates"].date),
+        Index("ix_potluck_event_user", c["potluck"].event_id, c["potluck"].user_id),
+        Index("ix_wishes_event_claimed_by_user", c["wishes"].event_id, c["wishes"].claimed_by_id, c["wishes"].user_id),
+        Index("ix_wishes_event_user", c["wishes"].event_id, c["wishes"].user_id),
+        Index("uq_votes_event_voter_potluck", c["votes"].event_id, c["votes"].voter_id, c["votes"].potluck_id, unique=True),
+        Index("ix_votes_event_potluck_dish", c["votes"].event_id, c["votes"].potluck_id, c["votes"].dish_choice),
+    ]:
+        index.create(conn)
+
+    conn.exec_driver_sql("DROP TABLE vote_totals")
+    conn.exec_driver_sql("DROP TABLE date_totals")
+    Table(
+        "vote_totals", MetaData(),
+        Column("event_id", Integer, primary_key=True),
+        Column("potluck_id", Integer, primary_key=True),
+        Column("dish_choice", Integer, primary_key=True),
+        Column("total", Integer, nullable=False),
+    ).create(conn)
+    Table(
+        "date_totals", MetaData(),
+        Column("event_id", Integer, primary_key=True),
+        Column("date", Date, primary_key=True),
+        Column("attendees", Integer, nullable=False),
+    ).create(conn)
+    counters.install_triggers(conn)
+    counters.rebuild(conn)
+
+
+def _sessions(conn):
+    session_meta = MetaData()
+    Table(
+        "settings", session_meta,
+        Column("key", String(50), primary_key=True),
+        Column("value", Text, nullable=False),
+    )
+    Table(
+        "revoked_sessions", session_meta,
+        Column("session_id", String(32), primary_key=True),
+        Column("expires_at", Integer, nullable=False),
+    )
+    session_meta.create_all(conn, checkfirst=True)
+
+
+def _santa(conn):
+    santa_meta = MetaData()
+    Table("events", santa_meta, Column("id", Integer, primary_key=True))
+    Table("users", santa_meta, Column("id", Integer, primary_key=True))
+    Table(
+        "santa_exclusions", santa_meta,
+        Column("event_id", Integer, ForeignKey("events.id"), primary_key=True),
+        Column("giver_id", Integer, ForeignKey("users.id"), primary_key=True),
+        Column("receiver_id", Integer, ForeignKey("users.id"), primary_key=True),
+    ).create(conn, checkfirst=True)
+    Table(
+        "santa_pairs", santa_meta,
+        Column("event_id", Integer, ForeignKey("events.id"), primary_key=True),
+        Column("giver_id", Integer, ForeignKey("users.id"), primary_key=True),
+        Column("receiver_id", Integer, ForeignKey("users.id"), nullable=False),
+        UniqueConstraint("event_id", "receiver_id", name="uq_santa_pairs_event_receiver"),
+    ).create(conn, checkfirst=True)
+
+
+def _data_versions(conn):
+    version_meta = MetaData()
+    Table("events", version_meta, Column("id", Integer, primary_key=True))
+    Table(
+        "data_versions", version_meta,
+        Column("event_id", Integer, ForeignKey("events.id"), primary_key=True),
+        *[Column(area, Integer, nullable=False, default=0) for area in ("availability", "potlucks", "votes", "wishes")],
+    ).create(conn, checkfirst=True)
+
+
+# (version, description, step). Append only; never edit a released step.
+MIGRATIONS = [
+    (1, "baseline schema", _baseline),
+    (2, "one availability row per user and date", _availability_dates),
+    (3, "index wishes on (claimed_by_id, user_id)", _wishes_claim_index),
+    (4, "one vote per voter and potluck", _unique_votes),
+    (5, "vote and attendee counter tables", _counters),
+    (6, "events; scope every row to an event", _events),
+    (7, "settings and revoked session tokens", _sessions),
+    (8, "secret santa exclusions and drawn pairs", _santa),
+    (9, "per-event data version counters", _data_versions),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def _acquire_lock(conn):
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        # Takes the write lock now; other workers wait on busy_timeout
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    elif dialect == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+    elif dialect == "mysql":
+        conn.execute(text("SELECT GET_LOCK(:name, 60)"), {"name": LOCK_NAME})
+
+
+def _release_lock(conn):
+    # SQLite and Postgres release on commit/rollback
+    if conn.dialect.name == "mysql":
+        conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": LOCK_NAME})
+
+
+def _set_version(conn, version):
+    conn.execute(version_table.delete())
+    conn.execute(version_table.insert().values(version=version))
+
+
+def current_version(conn):
+    if not inspect(conn).has_table("schema_version"):
+        return None
+    return conn.execute(select(version_table.c.version)).scalar()
+
+
+def upgrade(engine):
+    """Bring the database up to LATEST_VERSION and return the version."""
+    with engine.connect() as conn:
+        _acquire_lock(conn)
+        try:
+            version = current_version(conn)
+            if version is None:
+                if not inspect(conn).has_table("users"):
+                    Base.metadata.create_all(conn)
+                    # Triggers and the first event are not part of the models
+                    counters.install_triggers(conn)
+                    _default_event(conn, Event.__table__)
+                    version = LATEST_VERSION
+                else:
+                    version = 0
+                meta.create_all(conn)
+                _set_version(conn, version)
+
+            for number, description, step in MIGRATIONS:
+                if number > version:
+                    print(f"Applying migration {number}: {description}", file=sys.stderr)
+                    step(conn)
+                    _set_version(conn, number)
+                    version = number
+            conn.commit()
+        finally:
+            _release_lock(conn)
+    return version
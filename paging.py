@@ -0,0 +1,55 @@
+"""Search and pagination for the long per-person lists.
+
+The gift market and the potluck vote cards render a few Streamlit elements
+per participant, so with hundreds of people a rerun sends thousands of
+elements to the browser. The pages show one page of them at a time, taken
+from the shared cached aggregates (see cache.py), so paging costs no extra
+query and works the same in snapshot mode.
+
+The market order is a per-user shuffle that does not move: each item's
+position comes from a hash of (seed, item id) instead of a shuffle of the
+whole list, so it is the same on every rerun and claiming a wish only
+removes that wish without reordering the pages around it.
+"""
+import hashlib
+import os
+
+from assignment import normalize_dish
+
+MARKET_PAGE_SIZE = int(os.environ.get("MARKET_PAGE_SIZE", 20))
+VOTE_PAGE_SIZE = int(os.environ.get("VOTE_PAGE_SIZE", 10))
+
+
+def matches(query, *texts):
+    """True if every word of query appears in one of texts.
+
+    Case, accents and punctuation are ignored (the same folding as dish
+    names), so "bunuelos" finds "Buñuelos".
+    """
+    words = normalize_dish(query).split()
+    if not words:
+        return True
+    haystack = " ".join(normalize_dish(t) for t in texts if t)
+    return all(word in haystack for word in words)
+
+
+def seeded_order(items, *seed):
+    """items sorted by a hash of (seed, item["id"]): a stable shuffle."""
+    prefix = ":".join(str(s) for s in seed).encode()
+
+    def rank(item):
+        return hashlib.blake2b(prefix + b":%d" % item["id"], digest_size=8).digest()
+
+    return sorted(items, key=rank)
+
+
+def paginate(items, page, size):
+    """(items on page, page, number of pages); page is clamped to the range.
+
+    A size of 0 or less turns paging off and returns everything.
+    """
+    if size <= 0:
+        return items, 0, 1
+    pages = max(1, -(-len(items) // size))
+    page = min(max(page, 0), pages - 1)
+    return items[page * size:(page + 1) * size], page, pages
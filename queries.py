@@ -0,0 +1,478 @@
+"""Data access shared by the page functions.
+
+Everything is scoped to one event: functions take the event id right after
+the session, and the shared aggregates are cached per (key, event id), so
+one process serves many events without their data or caches mixing.
+
+Reads return plain Python values (tuples, dicts), never ORM objects, so the
+results can be cached or shared between sessions safely. Writes commit
+their own transaction, bumping the data version of the area they change
+in it (versions.py), and invalidate the cached aggregates they change.
+Votes, date edits and wish claims go through the write-behind queue
+(writequeue.py) instead when it is on.
+
+The ``cached_*`` readers go through the shared aggregate cache (cache.py),
+or serve the background snapshot when snapshot mode is on (snapshot.py);
+use them for group-wide views that look the same to every user.
+"""
+from sqlalchemy import select, update, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager
+
+from cache import aggregates, AVAILABILITY, AVAILABILITY_MATRIX, POTLUCKS, VOTES, WISHES
+from db import (
+    User, Event, EventMember, Availability, Potluck, Wish, Vote, VoteTotal, DateTotal,
+    SantaExclusion, SantaPair, upsert,
+)
+import santa
+from snapshot import snapshots
+import versions
+from writequeue import write_queue
+
+
+def _shared(key, session, event_id, loader):
+    value = snapshots.get(key, event_id)
+    if value is not None:
+        return value
+    return aggregates.get((key, event_id), lambda: loader(session, event_id))
+
+
+def _write(session, name, apply, key, event_id, *args):
+    # apply(session, event_id, *args) changes rows without committing, so
+    # the write queue can commit many of them together
+    if write_queue.enabled:
+        # End this session's transaction first, so its pooled connection is
+        # free for the writer thread while the caller waits
+        session.commit()
+        return write_queue.submit(name, event_id, *args).result()
+    result = apply(session, event_id, *args)
+    versions.bump(session, (key, event_id))
+    session.commit()
+    aggregates.invalidate((key, event_id))
+    return result
+
+
+# ----------------------------------------
+# Events
+# ----------------------------------------
+
+def event_by_slug(session, slug):
+    """(id, slug, name) of the event, or None."""
+    row = session.execute(select(Event.id, Event.slug, Event.name).where(Event.slug == slug)).first()
+    return tuple(row) if row else None
+
+
+def default_event(session):
+    """The oldest event; the one used when no event is given."""
+    row = session.execute(select(Event.id, Event.slug, Event.name).order_by(Event.id).limit(1)).first()
+    return tuple(row) if row else None
+
+
+def user_events(session, user_id):
+    """[(id, slug, name)] of the events the user belongs to."""
+    return [tuple(row) for row in session.execute(
+        select(Event.id, Event.slug, Event.name)
+        .join(EventMember, EventMember.event_id == Event.id)
+        .where(EventMember.user_id == user_id)
+        .order_by(Event.id)
+    )]
+
+
+def join_event(session, event_id, user_id):
+    """Make the user a member of the event (no-op if already one)."""
+    if session.get(EventMember, (event_id, user_id)) is None:
+        session.add(EventMember(event_id=event_id, user_id=user_id))
+        try:
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+
+
+def event_members(session, event_id):
+    """[(user_id, name)] of the event's members, by name."""
+    rows = session.execute(
+        select(User.id, User.name, User.username)
+        .join(EventMember, EventMember.user_id == User.id)
+        .where(EventMember.event_id == event_id)
+    )
+    return sorted(((row.id, row.name or row.username) for row in rows), key=lambda m: m[1].lower())
+
+
+# ----------------------------------------
+# Availability
+# ----------------------------------------
+
+def user_dates(session, event_id, user_id):
+    return list(session.scalars(
+        select(Availability.date)
+        .where(Availability.event_id == event_id, Availability.user_id == user_id)
+        .order_by(Availability.date)
+    ))
+
+
+def _add_date(session, event_id, user_id, date):
+    # Checked up front so a duplicate does not abort a whole queued batch;
+    # the unique constraint still catches concurrent inserts
+    exists = session.scalar(
+        select(Availability.id)
+        .where(Availability.event_id == event_id, Availability.user_id == user_id, Availability.date == date)
+        .limit(1)
+    )
+    if exists is not None:
+        return False
+    session.add(Availability(event_id=event_id, user_id=user_id, date=date))
+    session.flush()
+    return True
+
+
+def add_date(session, event_id, user_id, date):
+    """Insert one availability row. Returns False if the user already had it."""
+    try:
+        return _write(session, "add_date", _add_date, AVAILABILITY, event_id, user_id, date)
+    except IntegrityError:
+        session.rollback()
+        return False
+
+
+def _remove_date(session, event_id, user_id, date):
+    session.execute(
+        Availability.__table__.delete()
+        .where(Availability.event_id == event_id, Availability.user_id == user_id, Availability.date == date)
+    )
+
+
+def remove_date(session, event_id, user_id, date):
+    _write(session, "remove_date", _remove_date, AVAILABILITY, event_id, user_id, date)
+
+
+def group_date_counts(session, event_id):
+    """[(date, attendees)] for every proposed date, most popular first."""
+    # date_totals is kept current by triggers (counters.py)
+    return [tuple(row) for row in session.execute(
+        select(DateTotal.date, DateTotal.attendees)
+        .where(DateTotal.event_id == event_id)
+        .order_by(DateTotal.attendees.desc(), DateTotal.date)
+    )]
+
+
+def cached_group_date_counts(session, event_id):
+    return _shared(AVAILABILITY, session, event_id, group_date_counts)
+
+
+def availability_matrix(session, event_id):
+    """recommend.AvailabilityMatrix of the event, cached until its availability changes."""
+    def load():
+        # NumPy is only loaded once someone asks for a recommendation
+        from recommend import AvailabilityMatrix
+        return AvailabilityMatrix(session.execute(
+            select(Availability.user_id, Availability.date).where(Availability.event_id == event_id)
+        ))
+    return aggregates.get((AVAILABILITY_MATRIX, event_id), load)
+
+
+def _drop_stale_matrices(*keys):
+    stale = [(AVAILABILITY_MATRIX, event_id) for key, event_id in keys if key == AVAILABILITY]
+    if stale:
+        aggregates.invalidate(*stale)
+
+
+# ----------------------------------------
+# Potluck & Votes
+# ----------------------------------------
+
+def own_potluck(session, event_id, user_id):
+    """{"dish_1", "dish_2", "dish_3", "assigned_dish"} of the user's potluck entry, or None."""
+    row = session.execute(
+        select(Potluck.dish_1, Potluck.dish_2, Potluck.dish_3, Potluck.assigned_dish)
+        .where(Potluck.event_id == event_id, Potluck.user_id == user_id)
+        .limit(1)
+    ).first()
+    return dict(row._mapping) if row else None
+
+
+def save_potluck(session, event_id, user_id, dish_1, dish_2, dish_3):
+    potluck = session.query(Potluck).filter(Potluck.event_id == event_id, Potluck.user_id == user_id).first()
+    if not potluck:
+        potluck = Potluck(event_id=event_id, user_id=user_id)
+        session.add(potluck)
+    potluck.dish_1 = dish_1
+    potluck.dish_2 = dish_2
+    potluck.dish_3 = dish_3
+    versions.bump(session, (POTLUCKS, event_id))
+    session.commit()
+    aggregates.invalidate((POTLUCKS, event_id))
+
+
+def potluck_table(session, event_id):
+    """Every potluck entry of the event with its owner's display name, in table order."""
+    potlucks = (
+        session.query(Potluck)
+        .join(Potluck.user)
+        .options(contains_eager(Potluck.user))
+        .filter(Potluck.event_id == event_id)
+        .order_by(Potluck.id)
+        .all()
+    )
+    return [{
+        "id": p.id,
+        "user_id": p.user_id,
+        "name": p.user.name or p.user.username,
+        "dish_1": p.dish_1,
+        "dish_2": p.dish_2,
+        "dish_3": p.dish_3,
+        "assigned_dish": p.assigned_dish,
+    } for p in potlucks]
+
+
+def cached_potluck_table(session, event_id):
+    return _shared(POTLUCKS, session, event_id, potluck_table)
+
+
+def save_assignments(session, event_id, assignments):
+    """Write {potluck_id: assigned_dish} in one transaction."""
+    potlucks = session.query(Potluck).filter(Potluck.event_id == event_id, Potluck.id.in_(list(assignments)))
+    for p in potlucks:
+        p.assigned_dish = assignments[p.id]
+    versions.bump(session, (POTLUCKS, event_id))
+    session.commit()
+    aggregates.invalidate((POTLUCKS, event_id))
+
+
+def my_votes(session, event_id, user_id):
+    """{potluck_id: dish_choice} for the user's votes."""
+    return dict(session.execute(
+        select(Vote.potluck_id, Vote.dish_choice).where(Vote.event_id == event_id, Vote.voter_id == user_id)
+    ).all())
+
+
+def vote_counts(session, event_id):
+    """{(potluck_id, dish_choice): votes}"""
+    rows = session.execute(
+        select(VoteTotal.potluck_id, VoteTotal.dish_choice, VoteTotal.total)
+        .where(VoteTotal.event_id == event_id)
+    )
+    return {(potluck_id, dish): count for potluck_id, dish, count in rows}
+
+
+def cached_vote_counts(session, event_id):
+    return _shared(VOTES, session, event_id, vote_counts)
+
+
+def _cast_vote(session, event_id, user_id, potluck_id, dish_choice):
+    # One vote per voter and potluck (unique index); voting again changes
+    # the choice. A single upsert, so double-clicks cannot race.
+    values = {"event_id": event_id, "voter_id": user_id, "potluck_id": potluck_id, "dish_choice": dish_choice}
+    stmt = upsert(
+        session.get_bind().dialect.name, Vote, values,
+        [Vote.event_id, Vote.voter_id, Vote.potluck_id], lambda new: {"dish_choice": new.dish_choice},
+    )
+    if stmt is not None:
+        session.execute(stmt)
+        return
+    existing_vote = session.query(Vote).filter(
+        Vote.event_id == event_id, Vote.voter_id == user_id, Vote.potluck_id == potluck_id
+    ).first()
+    if existing_vote:
+        existing_vote.dish_choice = dish_choice
+    else:
+        session.add(Vote(**values))
+    session.flush()
+
+
+def cast_vote(session, event_id, user_id, potluck_id, dish_choice):
+    _write(session, "vote", _cast_vote, VOTES, event_id, user_id, potluck_id, dish_choice)
+
+
+# ----------------------------------------
+# Secret Santa wishes
+# ----------------------------------------
+
+def my_wishes(session, event_id, user_id):
+    """[{"id", "description"}] of the user's wishes."""
+    return [dict(row._mapping) for row in session.execute(
+        select(Wish.id, Wish.description).where(Wish.event_id == event_id, Wish.user_id == user_id).order_by(Wish.id)
+    )]
+
+
+def my_claims(session, event_id, user_id):
+    """[{"id", "description"}] of the wishes the user claimed."""
+    return [dict(row._mapping) for row in session.execute(
+        select(Wish.id, Wish.description)
+        .where(Wish.event_id == event_id, Wish.claimed_by_id == user_id)
+        .order_by(Wish.id)
+    )]
+
+
+def add_wish(session, event_id, user_id, description):
+    session.add(Wish(event_id=event_id, user_id=user_id, description=description))
+    versions.bump(session, (WISHES, event_id))
+    session.commit()
+    aggregates.invalidate((WISHES, event_id))
+
+
+def open_wishes(session, event_id):
+    """[{"id", "user_id", "description"}] for every unclaimed wish of the event."""
+    wishes = (
+        session.query(Wish)
+        .filter(Wish.event_id == event_id, Wish.claimed_by_id == None)
+        .order_by(Wish.id)
+        .all()
+    )
+    return [{"id": w.id, "user_id": w.user_id, "description": w.description} for w in wishes]
+
+
+def cached_open_wishes(session, event_id):
+    return _shared(WISHES, session, event_id, open_wishes)
+
+
+def _claim_wish(session, event_id, wish_id, user_id):
+    result = session.execute(
+        update(Wish)
+        .where(Wish.event_id == event_id, Wish.id == wish_id, Wish.claimed_by_id.is_(None), Wish.user_id != user_id)
+        .values(claimed_by_id=user_id)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def claim_wish(session, event_id, wish_id, user_id):
+    """Claim a wish for user_id if it is still unclaimed and not their own.
+
+    A single conditional UPDATE, so when several people click the same wish
+    at once exactly one of them gets it. Returns True for the winner.
+    """
+    return _write(session, "claim_wish", _claim_wish, WISHES, event_id, wish_id, user_id)
+
+
+def _release_wish(session, event_id, wish_id, user_id):
+    result = session.execute(
+        update(Wish)
+        .where(Wish.event_id == event_id, Wish.id == wish_id, Wish.claimed_by_id == user_id)
+        .values(claimed_by_id=None)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def release_wish(session, event_id, wish_id, user_id):
+    """Give back a wish; only the user who claimed it can release it."""
+    return _write(session, "release_wish", _release_wish, WISHES, event_id, wish_id, user_id)
+
+
+# ----------------------------------------
+# Secret Santa draw
+# ----------------------------------------
+
+def santa_exclusions(session, event_id):
+    """Set of (giver_id, receiver_id) pairs the event's draw must avoid."""
+    return set(map(tuple, session.execute(
+        select(SantaExclusion.giver_id, SantaExclusion.receiver_id).where(SantaExclusion.event_id == event_id)
+    )))
+
+
+def add_exclusion(session, event_id, giver_id, receiver_id, mutual=True):
+    """Keep giver_id from drawing receiver_id (and the reverse, for couples)."""
+    pairs = {(giver_id, receiver_id), (receiver_id, giver_id)} if mutual else {(giver_id, receiver_id)}
+    pairs -= santa_exclusions(session, event_id)
+    session.add_all(SantaExclusion(event_id=event_id, giver_id=g, receiver_id=r) for g, r in pairs)
+    session.commit()
+
+
+def santa_pairs(session, event_id):
+    """{giver_id: receiver_id} of the event's last draw."""
+    return dict(session.execute(
+        select(SantaPair.giver_id, SantaPair.receiver_id).where(SantaPair.event_id == event_id)
+    ).all())
+
+
+def santa_draw_events(session, event_id):
+    """[(id, name)] of the other events that have a draw, newest first.
+
+    Events are not linked to each other, so the admin picks which one was
+    this group's "last year" from these.
+    """
+    drawn = select(SantaPair.event_id).where(SantaPair.event_id != event_id).distinct()
+    return [tuple(row) for row in session.execute(
+        select(Event.id, Event.name).where(Event.id.in_(drawn)).order_by(Event.id.desc())
+    )]
+
+
+def claimed_pairs(session, event_id):
+    """{claimer_id: wish owner_id} from the market, first claim per claimer.
+
+    Claims made before the draw are kept as pairs so nobody ends up buying
+    for two people; a claimer's later claims, and claims on someone another
+    claimer already covers, are left out.
+    """
+    pairs, covered = {}, set()
+    for claimer, owner in session.execute(
+        select(Wish.claimed_by_id, Wish.user_id)
+        .where(Wish.event_id == event_id, Wish.claimed_by_id.is_not(None))
+        .order_by(Wish.id)
+    ):
+        if claimer not in pairs and owner not in covered and claimer != owner:
+            pairs[claimer] = owner
+            covered.add(owner)
+    return pairs
+
+
+def save_santa_pairs(session, event_id, pairs):
+    """Replace the event's draw with {giver_id: receiver_id} in one transaction."""
+    session.execute(delete(SantaPair).where(SantaPair.event_id == event_id))
+    session.execute(
+        SantaPair.__table__.insert(),
+        [{"event_id": event_id, "giver_id": g, "receiver_id": r} for g, r in pairs.items()],
+    )
+    session.commit()
+
+
+def draw_santa(session, event_id, avoid_event_id=None, keep_claims=True, seed=None):
+    """Draw and save the event's Secret Santa; every member takes part.
+
+    avoid_event_id: another event (e.g. last year's) whose drawn pairs must
+    not repeat. Returns (pairs, kept_claims): kept_claims is False when the market's
+    claims could not be kept under the exclusions and the draw ignored them.
+    Raises ValueError (from santa.draw_pairs) if no draw is possible.
+    """
+    members = session.execute(select(EventMember.user_id).where(EventMember.event_id == event_id)).scalars().all()
+    exclusions = santa_exclusions(session, event_id)
+    if avoid_event_id is not None:
+        exclusions.update(santa_pairs(session, avoid_event_id).items())
+    fixed = {}
+    if keep_claims:
+        joined = set(members)
+        fixed = {
+            g: r for g, r in claimed_pairs(session, event_id).items()
+            if g in joined and r in joined and (g, r) not in exclusions
+        }
+    try:
+        pairs = santa.draw_pairs(members, exclusions, fixed=fixed, seed=seed)
+    except ValueError:
+        if not fixed:
+            raise
+        pairs, fixed = santa.draw_pairs(members, exclusions, seed=seed), None
+    save_santa_pairs(session, event_id, pairs)
+    return pairs, fixed is not None
+
+
+def my_santa_receiver(session, event_id, user_id):
+    """(user_id, name) of who the user gives to, or None before the draw."""
+    row = session.execute(
+        select(User.id, User.name, User.username)
+        .join(SantaPair, SantaPair.receiver_id == User.id)
+        .where(SantaPair.event_id == event_id, SantaPair.giver_id == user_id)
+    ).first()
+    return (row.id, row.name or row.username) if row else None
+
+
+for _key, _loader in [(AVAILABILITY, group_date_counts), (POTLUCKS, potluck_table),
+                      (VOTES, vote_counts), (WISHES, open_wishes)]:
+    snapshots.register(_key, _loader)
+aggregates.subscribe(snapshots.mark_dirty)
+aggregates.subscribe(_drop_stale_matrices)
+
+write_queue.register("add_date", _add_date, AVAILABILITY)
+write_queue.register("remove_date", _remove_date, AVAILABILITY)
+write_queue.register("vote", _cast_vote, VOTES)
+write_queue.register("claim_wish", _claim_wish, WISHES)
+write_queue.register("release_wish", _release_wish, WISHES)
@@ -0,0 +1,96 @@
+"""Best-date recommendations from the group's availability.
+
+Availability is held as a days x users bit matrix: one row per calendar
+day from the first to the last proposed date (days nobody proposed are
+empty rows, so windows of consecutive days are plain slices), and in each
+row one bit per user, packed eight to a byte. A year of dates for 20,000
+users is under 1 MB. Every question is then a few whole-array operations:
+
+- best single date: popcount of each row;
+- best N-day window: AND of N consecutive rows, built from
+  power-of-two blocks (log N passes over the matrix, not N), then
+  popcount; ties go to the window with more person-days;
+- dates that suit a required subset: AND each row with the subset's
+  bit mask and popcount that.
+
+queries.availability_matrix() builds one per event and caches it until
+the event's availability changes.
+"""
+import datetime
+
+import numpy as np
+
+# Set bits in every byte value; indexing with a uint8 array counts a whole
+# matrix at once
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount_rows(bits):
+    return _POPCOUNT[bits].sum(axis=1, dtype=np.int64)
+
+
+class AvailabilityMatrix:
+    def __init__(self, rows):
+        """rows: iterable of (user_id, date) pairs, one per available day."""
+        pairs = np.array([(user_id, date.toordinal()) for user_id, date in rows], dtype=np.int64).reshape(-1, 2)
+        self.user_ids = np.unique(pairs[:, 0])
+        self.start = int(pairs[:, 1].min()) if len(pairs) else 0
+        self.days = int(pairs[:, 1].max()) - self.start + 1 if len(pairs) else 0
+        dense = np.zeros((self.days, len(self.user_ids)), dtype=bool)
+        dense[pairs[:, 1] - self.start, np.searchsorted(self.user_ids, pairs[:, 0])] = True
+        self.bits = np.packbits(dense, axis=1)
+        self.counts = _popcount_rows(self.bits)
+
+    def date(self, day):
+        return datetime.date.fromordinal(self.start + int(day))
+
+    def _top(self, scores, k):
+        # Indices of the k best scores (already combined into one key), best first
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top], kind="stable")]
+
+    def best_dates(self, k=5):
+        """[(date, attendees)] of the k dates most people can make."""
+        # Earlier dates win ties
+        scores = self.counts * (self.days + 1) + (self.days - np.arange(self.days))
+        return [(self.date(d), int(self.counts[d])) for d in self._top(scores, k) if self.counts[d]]
+
+    def window_bits(self, length):
+        """Bits of the users free on every day of each length-day window.
+
+        Row i covers days i .. i + length - 1.
+        """
+        if length < 1 or length > self.days:
+            return self.bits[:0]
+        block, size = self.bits, 1
+        while size * 2 <= length:
+            block = block[:-size] & block[size:]
+            size *= 2
+        # Two overlapping power-of-two blocks cover the window exactly
+        return block[:len(block) - (length - size)] & block[length - size:]
+
+    def best_windows(self, length, k=5):
+        """[(first date, people free on every day, person-days)] of the best length-day windows."""
+        full = _popcount_rows(self.window_bits(length))
+        if not len(full):
+            return []
+        cumulative = np.concatenate(([0], np.cumsum(self.counts)))
+        person_days = cumulative[length:] - cumulative[:-length]
+        scores = full * (len(self.user_ids) * length + 1) + person_days
+        return [(self.date(d), int(full[d]), int(person_days[d])) for d in self._top(scores, k) if person_days[d]]
+
+    def covering_dates(self, required_ids, k=5):
+        """[(date, required people free, attendees)], most of the required first.
+
+        Required users with no availability at all are never covered; the
+        caller compares the first number with len(required_ids).
+        """
+        wanted = np.isin(self.user_ids, np.fromiter(required_ids, dtype=np.int64))
+        if not self.days or not wanted.any():
+            return []
+        covered = _popcount_rows(self.bits & np.packbits(wanted))
+        scores = covered * (len(self.user_ids) + 1) + self.counts
+        return [(self.date(d), int(covered[d]), int(self.counts[d])) for d in self._top(scores, k) if covered[d]]
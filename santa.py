@@ -0,0 +1,139 @@
+"""Secret Santa pairing.
+
+Every participant gives exactly one gift and receives exactly one: the
+result is a permutation of the participants with no fixed points (nobody
+draws themselves) that avoids every excluded (giver, receiver) pair, such
+as couples or last year's pairs. Pairs already settled elsewhere (a wish
+claimed in the market) can be passed in as fixed and are kept as they are.
+
+The draw is randomized: shuffle the receivers onto the givers, then repair
+each forbidden pair by swapping receivers with a random other giver for
+whom the swap is also allowed. With the few exclusions per person real
+groups have, a handful of swaps fixes a draw of thousands in a few
+milliseconds. If that keeps failing (very dense or very lopsided
+exclusions), the pairs that are valid are kept and the rest are completed
+with augmenting paths (Kuhn's bipartite matching), which finds a complete
+draw whenever one exists. If none exists, ValueError says who cannot be
+placed.
+"""
+import random
+
+ATTEMPTS = 5          # shuffles tried before falling back to matching
+SWAP_TRIES = 64       # random partners tried to repair one forbidden pair
+
+
+def draw_pairs(participants, exclusions=(), fixed=None, seed=None):
+    """Draw a complete Secret Santa.
+
+    participants: iterable of ids.
+    exclusions: iterable of (giver, receiver) pairs that must not be drawn;
+        pairs naming non-participants are ignored. A pair only excludes
+        that direction; add both for couples.
+    fixed: optional {giver: receiver} kept as given.
+
+    Returns {giver: receiver} covering every participant once as giver and
+    once as receiver. Raises ValueError if no such draw exists.
+    """
+    people = sorted(set(participants))
+    if len(people) < 2:
+        raise ValueError("Se necesitan al menos 2 participantes.")
+    index = set(people)
+    # One flat set of pairs: cheap to build even with millions of exclusions
+    excluded = exclusions if isinstance(exclusions, (set, frozenset)) else set(exclusions)
+
+    fixed = dict(fixed or {})
+    taken = set(fixed.values())
+    for giver, receiver in fixed.items():
+        if giver not in index or receiver not in index or not _allowed(giver, receiver, excluded):
+            raise ValueError(f"Pareja fija inválida: {giver} → {receiver}")
+    if len(taken) != len(fixed):
+        raise ValueError("Dos parejas fijas tienen el mismo destinatario.")
+
+    givers = [p for p in people if p not in fixed]
+    receivers = [p for p in people if p not in taken]
+    rng = random.Random(seed)
+
+    pairs = None
+    for _ in range(ATTEMPTS):
+        pairs, complete = _shuffle_and_repair(givers, receivers, excluded, rng)
+        if complete:
+            return {**fixed, **pairs}
+    return {**fixed, **_complete_matching(givers, receivers, excluded, pairs, rng)}
+
+
+def _allowed(giver, receiver, excluded):
+    return giver != receiver and (giver, receiver) not in excluded
+
+
+def _shuffle_and_repair(givers, receivers, excluded, rng):
+    order = list(receivers)
+    rng.shuffle(order)
+    pairs = dict(zip(givers, order))
+    for giver in givers:
+        if _allowed(giver, pairs[giver], excluded):
+            continue
+        for _ in range(SWAP_TRIES):
+            other = rng.choice(givers)
+            if _allowed(giver, pairs[other], excluded) and _allowed(other, pairs[giver], excluded):
+                pairs[giver], pairs[other] = pairs[other], pairs[giver]
+                break
+        else:
+            return pairs, False
+    return pairs, True
+
+
+def _complete_matching(givers, receivers, excluded, pairs, rng):
+    # Keep the valid pairs of the last draw and augment from every giver
+    # left over. Receivers are tried in one shared random order; a giver's
+    # allowed receivers are never materialized, so memory stays O(n) even
+    # when almost every pair is allowed.
+    order = list(receivers)
+    rng.shuffle(order)
+    match = {}       # giver -> receiver
+    owner = {}       # receiver -> giver
+    for giver, receiver in (pairs or {}).items():
+        if _allowed(giver, receiver, excluded):
+            match[giver] = receiver
+            owner[receiver] = giver
+
+    stuck = []
+    for start in givers:
+        if start not in match and not _augment(start, order, excluded, match, owner):
+            stuck.append(start)
+    if stuck:
+        raise ValueError(
+            f"No hay sorteo posible con estas exclusiones; sin destinatario: {', '.join(map(str, stuck[:10]))}"
+        )
+    return match
+
+
+def _augment(start, order, excluded, match, owner):
+    """Find an augmenting path from start (iterative DFS) and flip it."""
+    visited = set()
+    # Each frame: (giver, position in order to resume from)
+    stack = [(start, 0)]
+    path = []        # receivers chosen along the current path
+    while stack:
+        giver, pos = stack.pop()
+        while pos < len(order):
+            receiver = order[pos]
+            pos += 1
+            if receiver in visited or not _allowed(giver, receiver, excluded):
+                continue
+            visited.add(receiver)
+            if receiver not in owner:
+                # Free receiver: shift every giver on the path along by one
+                path.append((giver, receiver))
+                for g, r in path:
+                    match[g] = r
+                    owner[r] = g
+                return True
+            stack.append((giver, pos))
+            path.append((giver, receiver))
+            stack.append((owner[receiver], 0))
+            break
+        else:
+            # Dead end: back up to the giver that led here
+            if path:
+                path.pop()
+    return False
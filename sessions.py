@@ -0,0 +1,167 @@
+"""Signed, expiring login tokens.
+
+After a login the app stores a token in a browser cookie (COOKIE_NAME),
+so a new tab, a reload or a reconnect restores the session instead of
+going back through the login form (one user lookup and one password KDF
+each). The token never goes in the link, so sharing the event link
+(``?evento=...``) does not share a login. Streamlit cannot set response
+headers, so the cookie is written by a script in the page; it is
+SameSite=Strict, and Secure over HTTPS. A token is
+
+    <payload>.<signature>
+
+where payload is the base64 JSON {"sid", "uid", "name", "exp"} and the
+signature an HMAC-SHA256 of it under the server secret. The secret comes
+from SESSION_SECRET or, if unset, is generated once and kept in the
+``settings`` table so every process shares it.
+
+Validated tokens are remembered in an in-process LRU keyed by token, so
+restoring a session is a dictionary lookup: no query, no KDF. ``revoke()``
+(on logout) records the session id in ``revoked_sessions`` and drops it
+from this process's LRU; other processes notice when their entry is older
+than SESSION_CACHE_TTL seconds and the token is checked against the table
+again.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy.exc import IntegrityError
+
+from db import get_session, Setting, RevokedSession
+
+SESSION_TTL = int(os.environ.get("SESSION_TTL_HOURS", 3 * 24)) * 3600
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", 4096))
+SESSION_CACHE_TTL = float(os.environ.get("SESSION_CACHE_TTL", 60))
+
+SECRET_SETTING = "session_secret"
+COOKIE_NAME = "reunion_sesion"
+
+_secret = os.environ.get("SESSION_SECRET", "").encode() or None
+_secret_lock = threading.Lock()
+_valid = OrderedDict()  # token -> (user_id, username, expires_at, checked_until)
+_valid_lock = threading.Lock()
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _load_secret():
+    session = get_session()
+    try:
+        setting = session.get(Setting, SECRET_SETTING)
+        if setting is None:
+            session.add(Setting(key=SECRET_SETTING, value=secrets.token_hex(32)))
+            try:
+                session.commit()
+            except IntegrityError:
+                # Another process created it first
+                session.rollback()
+            setting = session.get(Setting, SECRET_SETTING)
+        return setting.value.encode()
+    finally:
+        session.close()
+
+
+def _get_secret():
+    global _secret
+    if _secret is None:
+        with _secret_lock:
+            if _secret is None:
+                _secret = _load_secret()
+    return _secret
+
+
+def _sign(payload):
+    return _b64encode(hmac.new(_get_secret(), payload.encode(), hashlib.sha256).digest())
+
+
+def _decode(token):
+    """The payload dict of a well-signed token, or None."""
+    payload, _, signature = (token or "").partition(".")
+    if not signature or not hmac.compare_digest(_sign(payload), signature):
+        return None
+    try:
+        return json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+
+
+def issue(user_id, username, ttl=SESSION_TTL):
+    """A new token for the user, valid for ttl seconds."""
+    data = {"sid": secrets.token_hex(16), "uid": user_id, "name": username, "exp": int(time.time()) + ttl}
+    payload = _b64encode(json.dumps(data, separators=(",", ":")).encode())
+    token = f"{payload}.{_sign(payload)}"
+    _remember(token, user_id, username, data["exp"])
+    return token
+
+
+def _remember(token, user_id, username, expires_at):
+    if SESSION_CACHE_SIZE <= 0:
+        return
+    with _valid_lock:
+        _valid[token] = (user_id, username, expires_at, time.monotonic() + SESSION_CACHE_TTL)
+        _valid.move_to_end(token)
+        while len(_valid) > SESSION_CACHE_SIZE:
+            _valid.popitem(last=False)
+
+
+def validate(token):
+    """(user_id, username) for a valid, unexpired, unrevoked token, else None."""
+    with _valid_lock:
+        entry = _valid.get(token)
+        if entry is not None:
+            _valid.move_to_end(token)
+    if entry is not None and entry[3] > time.monotonic() and entry[2] > time.time():
+        return entry[0], entry[1]
+
+    data = _decode(token)
+    if not data or data["exp"] <= time.time():
+        _forget(token)
+        return None
+    session = get_session()
+    try:
+        revoked = session.get(RevokedSession, data["sid"]) is not None
+    finally:
+        session.close()
+    if revoked:
+        _forget(token)
+        return None
+    _remember(token, data["uid"], data["name"], data["exp"])
+    return data["uid"], data["name"]
+
+
+def _forget(token):
+    with _valid_lock:
+        _valid.pop(token, None)
+
+
+def revoke(token):
+    """Log the token out everywhere; expired revocations are pruned."""
+    _forget(token)
+    data = _decode(token)
+    if not data:
+        return
+    now = int(time.time())
+    session = get_session()
+    try:
+        session.query(RevokedSession).filter(RevokedSession.expires_at <= now).delete(synchronize_session=False)
+        if session.get(RevokedSession, data["sid"]) is None:
+            session.add(RevokedSession(session_id=data["sid"], expires_at=data["exp"]))
+        try:
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+    finally:
+        session.close()
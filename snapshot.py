@@ -0,0 +1,150 @@
+"""Read-only snapshot mode for the group views.
+
+At peak, most reruns are people refreshing the group sections (date counts,
+the potluck table, vote counts, open wishes). In snapshot mode a background
+thread rebuilds all of them every SNAPSHOT_INTERVAL seconds into one
+immutable Snapshot and swaps it in with a single reference assignment, so
+readers never see a half-built snapshot and never wait for the database.
+The ``cached_*`` readers in queries.py return the snapshot's values while
+the mode is on. Only events read in the last SNAPSHOT_EVENT_TTL seconds are
+included, so idle events sharing the process cost nothing.
+
+Writes still go to the database. Each one wakes the refresher, which
+rebuilds at most once per SNAPSHOT_MIN_GAP seconds, so a burst of votes
+costs one rebuild instead of one per voter. Until the first snapshot is
+built (or if building fails) readers fall back to the live queries.
+
+Turn it on with SNAPSHOT_MODE=1 or from the admin panel.
+"""
+import os
+import sys
+import threading
+import time
+from types import MappingProxyType
+
+from db import get_session
+
+SNAPSHOT_INTERVAL = float(os.environ.get("SNAPSHOT_INTERVAL", 5))
+SNAPSHOT_MIN_GAP = float(os.environ.get("SNAPSHOT_MIN_GAP", 1))
+SNAPSHOT_EVENT_TTL = float(os.environ.get("SNAPSHOT_EVENT_TTL", 600))
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class Snapshot:
+    __slots__ = ("taken_at", "build_time", "events", "_values")
+
+    def __init__(self, values, build_time):
+        self.taken_at = time.time()
+        self.build_time = build_time
+        self.events = frozenset(event_id for _, event_id in values)
+        self._values = MappingProxyType(values)
+
+    def get(self, key, event_id):
+        return self._values.get((key, event_id))
+
+    def age(self):
+        return time.time() - self.taken_at
+
+
+class SnapshotStore:
+    def __init__(self, interval=SNAPSHOT_INTERVAL, min_gap=SNAPSHOT_MIN_GAP, enabled=False):
+        self.interval = interval
+        self.min_gap = min_gap
+        self.enabled = enabled
+        self.last_error = None
+        self._loaders = {}
+        self._current = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._events = {}  # event_id -> last read (monotonic)
+
+    def register(self, key, loader):
+        """Include loader(session, event_id) for every active event under key."""
+        self._loaders[key] = loader
+
+    def current(self):
+        """The latest Snapshot, or None when the mode is off or none is built yet."""
+        if not self.enabled:
+            return None
+        self.start()
+        return self._current
+
+    def get(self, key, event_id):
+        """The snapshot's value for (key, event), or None to fall back to the live query."""
+        snapshot = self.current()
+        if snapshot is None:
+            return None
+        first_read = event_id not in self._events
+        self._events[event_id] = time.monotonic()
+        value = snapshot.get(key, event_id)
+        if value is None and first_read:
+            # Newly active event: have it in the next snapshot
+            self._wake.set()
+        return value
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="snapshot-refresh", daemon=True)
+                self._thread.start()
+
+    def set_enabled(self, value):
+        self.enabled = value
+        if value:
+            self.start()
+            self._wake.set()
+        else:
+            self._current = None
+
+    def mark_dirty(self, *keys):
+        # keys are (key, event_id) cache keys
+        if self.enabled and (not keys or any(key[0] in self._loaders for key in keys)):
+            self._wake.set()
+
+    def refresh(self):
+        """Build a new snapshot now and swap it in."""
+        start = time.perf_counter()
+        cutoff = time.monotonic() - SNAPSHOT_EVENT_TTL
+        for event_id, last_read in list(self._events.items()):
+            if last_read < cutoff:
+                self._events.pop(event_id, None)
+        session = get_session()
+        try:
+            values = {
+                (key, event_id): _freeze(loader(session, event_id))
+                for event_id in list(self._events)
+                for key, loader in self._loaders.items()
+            }
+        finally:
+            session.close()
+        self._current = Snapshot(values, time.perf_counter() - start)
+        return self._current
+
+    def _run(self):
+        while True:
+            if self.enabled:
+                try:
+                    self.refresh()
+                    self.last_error = None
+                except Exception as e:
+                    # Keep serving the previous snapshot; try again next round
+                    self.last_error = str(e)
+                    print(f"Snapshot refresh failed: {e}", file=sys.stderr)
+            woken = self._wake.wait(self.interval)
+            if woken:
+                # Let a burst of writes settle into a single rebuild
+                time.sleep(self.min_gap)
+                self._wake.clear()
+
+
+snapshots = SnapshotStore(enabled=os.environ.get("SNAPSHOT_MODE", "") not in ("", "0", "false"))
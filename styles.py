@@ -0,0 +1,62 @@
+"""The app's stylesheet, served as a static file.
+
+The CSS lives in assets/styles.css. On first use each process appends the
+landing carousel keyframes (images.carousel_css(), whose blurred
+placeholders are inlined images) and writes the result to
+static/css/app.<hash>.css, named after its content. Every rerun then sends
+only a <link> to it. The browser downloads the file once and keeps it,
+because any change to the CSS gives it a new name. Files from earlier
+versions are left in place for workers that may still link them; each is a
+few KB.
+
+Without static serving (server.enableStaticServing off), or if static/ is
+not writable, the CSS is inlined in every rerun as before.
+"""
+import hashlib
+import os
+import sys
+
+import streamlit as st
+
+from images import ROOT, STATIC_DIR, STATIC_URL, carousel_css
+
+SOURCE_PATH = os.path.join(ROOT, "assets", "styles.css")
+OUTPUT_DIR = os.path.join(STATIC_DIR, "css")
+
+
+@st.cache_resource
+def base_css():
+    with open(SOURCE_PATH, encoding="utf-8") as f:
+        return f.read()
+
+
+@st.cache_resource
+def stylesheet_url():
+    """URL of the built stylesheet, or None when it cannot be served."""
+    if not st.get_option("server.enableStaticServing"):
+        return None
+    css = base_css() + "\n\n/* --- Landing carousel (images.py) --- */\n" + carousel_css() + "\n"
+    data = css.encode("utf-8")
+    name = f"app.{hashlib.sha256(data).hexdigest()[:10]}.css"
+    path = os.path.join(OUTPUT_DIR, name)
+    try:
+        if not os.path.exists(path):
+            os.makedirs(OUTPUT_DIR, exist_ok=True)
+            # Written under a temporary name so no one is served half a file
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+    except OSError as e:
+        print(f"Could not write {path} ({e}); inlining the CSS", file=sys.stderr)
+        return None
+    return f"{STATIC_URL}css/{name}"
+
+
+def load_styles():
+    """Emit the stylesheet link (or the inline CSS) for this rerun."""
+    url = stylesheet_url()
+    if url:
+        st.markdown(f'<link rel="stylesheet" href="{url}">', unsafe_allow_html=True)
+    else:
+        st.markdown(f"<style>\n{base_css()}\n</style>", unsafe_allow_html=True)
@@ -0,0 +1,84 @@
+"""Per-event data versions, so open pages can notice changes cheaply.
+
+``data_versions`` holds one row per event with a counter for each area of
+shared data (availability, potlucks, votes, wishes, named like the cache
+keys in cache.py). Every write bumps its area's counter inside its own
+transaction: queries._write and the write queue do it for the queued
+writes, the other write helpers in queries.py call bump() themselves.
+
+Pages poll current() from a fragment that runs every LIVE_REFRESH_SECONDS
+(app.live_refresh): one primary-key read of one row per tick, and nothing
+drawn. Only when a counter has moved does the page rerun. The process
+keeps the versions it has caught up with; catch_up() drops the shared
+cached aggregates (which another worker may have changed) only for areas
+newer than that, so one change costs one reload per process, however many
+sessions notice it. Set LIVE_REFRESH_SECONDS=0 to turn polling off.
+"""
+import os
+import threading
+
+from sqlalchemy import select, update
+
+from cache import aggregates, AVAILABILITY, POTLUCKS, VOTES, WISHES
+from db import DataVersion, upsert
+
+LIVE_REFRESH_SECONDS = float(os.environ.get("LIVE_REFRESH_SECONDS", 5))
+
+AREAS = (AVAILABILITY, POTLUCKS, VOTES, WISHES)
+
+_seen = {}  # event_id -> {area: version} this process's cache has caught up with
+_seen_lock = threading.Lock()
+
+
+def bump(session, *keys):
+    """Count a change for each (area, event_id) cache key; the caller commits.
+
+    Keys for anything but the AREAS (e.g. derived caches) are ignored.
+    """
+    by_event = {}
+    for area, event_id in keys:
+        if area in AREAS:
+            by_event.setdefault(event_id, set()).add(area)
+    for event_id, areas in by_event.items():
+        areas = sorted(areas)
+        # One statement, so the first writers of a new event cannot race on
+        # the insert
+        stmt = upsert(
+            session.get_bind().dialect.name, DataVersion, dict(event_id=event_id, **{area: 1 for area in areas}),
+            [DataVersion.event_id], lambda new: {area: getattr(DataVersion, area) + 1 for area in areas},
+        )
+        if stmt is not None:
+            session.execute(stmt)
+            continue
+        result = session.execute(
+            update(DataVersion)
+            .where(DataVersion.event_id == event_id)
+            .values({area: getattr(DataVersion, area) + 1 for area in areas})
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            session.add(DataVersion(event_id=event_id, **{area: 1 for area in areas}))
+            session.flush()
+
+
+def current(session, event_id):
+    """{area: version} of the event; all zero before its first write."""
+    row = session.execute(
+        select(*[getattr(DataVersion, area) for area in AREAS]).where(DataVersion.event_id == event_id)
+    ).first()
+    return dict(zip(AREAS, row or [0] * len(AREAS)))
+
+
+def catch_up(event_id, now):
+    """Drop cached aggregates of the areas that moved past what this process saw.
+
+    now is a current() result. The first call for an event drops them all,
+    since nothing says how old the cached copies are.
+    """
+    with _seen_lock:
+        seen = _seen.get(event_id, {})
+        stale = [area for area in AREAS if now[area] > seen.get(area, -1)]
+        # Never go back: a session may report an older read than another's
+        _seen[event_id] = {area: max(now[area], seen.get(area, -1)) for area in AREAS}
+    if stale:
+        aggregates.invalidate(*[(area, event_id) for area in stale])
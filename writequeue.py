@@ -0,0 +1,171 @@
+"""Optional write-behind queue for the small, frequent writes.
+
+On SQLite every commit is an fsync under the database lock, so when the
+whole group votes at once the commits serialize and reruns queue behind
+them. With the queue on, queries.py hands votes, date edits and wish
+claims to one writer thread as named intents. The writer collects them for
+up to WRITE_QUEUE_FLUSH_MS (or until WRITE_QUEUE_MAX_BATCH are waiting),
+applies them in a single transaction and commits once. Each caller gets a
+Future resolving to its intent's own result.
+
+If a batch fails, it is rolled back and its intents are retried one per
+transaction, so one bad write only fails its own future. Pending writes are
+flushed when the process exits. Turn it on with WRITE_QUEUE=1.
+"""
+import atexit
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+import versions
+from cache import aggregates
+from db import get_session
+
+WRITE_QUEUE_FLUSH_MS = float(os.environ.get("WRITE_QUEUE_FLUSH_MS", 10))
+WRITE_QUEUE_MAX_BATCH = int(os.environ.get("WRITE_QUEUE_MAX_BATCH", 64))
+
+_STOP = object()
+
+
+class WriteQueue:
+    def __init__(self, flush_ms=WRITE_QUEUE_FLUSH_MS, max_batch=WRITE_QUEUE_MAX_BATCH, enabled=False):
+        self.flush_ms = flush_ms
+        self.max_batch = max_batch
+        self.enabled = enabled
+        self._intents = {}
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = {"writes": 0, "commits": 0, "retried": 0, "failed": 0}
+
+    def register(self, name, apply, *keys):
+        """Make apply(session, event_id, *args) an intent invalidating keys.
+
+        apply must not commit; the queue commits the whole batch. The cache
+        entries invalidated are (key, event_id) for each key.
+        """
+        self._intents[name] = (apply, keys)
+
+    def submit(self, name, *args):
+        """Queue an intent; returns a Future with apply()'s return value."""
+        if name not in self._intents:
+            raise KeyError(f"Unknown write intent: {name}")
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Write queue is closed")
+            self._start()
+            self._queue.put((name, args, future))
+        return future
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+            self._thread.start()
+
+    def close(self, timeout=10):
+        """Flush everything pending and stop the writer thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+            if thread is not None:
+                self._queue.put(_STOP)
+        if thread is not None:
+            thread.join(timeout)
+
+    def reopen(self):
+        """Allow submits again after close() (used by the benchmarks)."""
+        with self._lock:
+            self._closed = False
+            self._thread = None
+            self._queue = queue.Queue()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, **amounts):
+        with self._lock:
+            for key, amount in amounts.items():
+                self._stats[key] += amount
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_ms / 1000
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+        # Drain whatever was queued behind the stop marker
+        leftovers = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                leftovers.append(item)
+        if leftovers:
+            self._flush(leftovers)
+
+    def _flush(self, batch):
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        session = get_session()
+        try:
+            results = []
+            keys = set()
+            for name, args, future in batch:
+                apply, intent_keys = self._intents[name]
+                results.append(apply(session, *args))
+                keys.update((key, args[0]) for key in intent_keys)
+            versions.bump(session, *keys)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"Write batch of {len(batch)} failed ({e}); retrying one by one", file=sys.stderr)
+            self._count(retried=len(batch))
+            for item in batch:
+                self._apply_one(session, *item)
+            return
+        finally:
+            session.close()
+        aggregates.invalidate(*keys)
+        self._count(writes=len(batch), commits=1)
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _apply_one(self, session, name, args, future):
+        apply, keys = self._intents[name]
+        keys = [(key, args[0]) for key in keys]
+        try:
+            result = apply(session, *args)
+            versions.bump(session, *keys)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            self._count(failed=1)
+            future.set_exception(e)
+            return
+        aggregates.invalidate(*keys)
+        self._count(writes=1, commits=1)
+        future.set_result(result)
+
+
+write_queue = WriteQueue(enabled=os.environ.get("WRITE_QUEUE", "") not in ("", "0", "false"))
+atexit.register(write_queue.close)